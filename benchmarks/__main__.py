@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+from benchmarks.feed_server import FakeFeedServer, FeedServerConfig
+from benchmarks.smtp_sink import SmtpSink
+from rss_to_email.app import run_once
+from rss_to_email.config import Config, load_config
+from rss_to_email.email_render import render_email
+from rss_to_email.feeds import FeedItem, fetch_new_items
+from rss_to_email.httpclient import FetchSession, create_fetch_session
+from rss_to_email.metrics import RunMetrics
+from rss_to_email.state import State, load_state, save_state
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies a cron tick should only load once it has something to fetch or send.
+_HEAVY_MODULES = ("requests", "feedparser", "aiohttp", "croniter", "smtplib", "email.message")
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Report:
+    def __init__(self) -> None:
+        self.stages: dict[str, dict[str, float | int | None]] = {}
+        self.server: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str, **extra: float | int | None) -> Iterator[dict[str, float | int | None]]:
+        record: dict[str, float | int | None] = dict(extra)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - started
+            record["peak_rss_mb"] = _peak_rss_mb()
+            # Largest single worker process so far, e.g. with PARSE_WORKERS.
+            record["child_peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN) or None
+            self.stages[name] = record
+
+    def format(self) -> str:
+        lines = []
+        for name, record in self.stages.items():
+            details = ", ".join(
+                f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in record.items()
+                if key != "seconds" and value is not None
+            )
+            lines.append(f"{name:<22} {record['seconds']:9.3f}s  {details}")
+        lines.append("server                 " + ", ".join(f"{k}={v}" for k, v in self.server.items()))
+        return "\n".join(lines)
+
+
+def _fetch_stage(
+    report: Report, name: str, *, config: Config, prior_state: State, session: FetchSession
+) -> tuple[list[FeedItem], State]:
+    metrics = RunMetrics()
+    with report.stage(name) as record:
+        items, failures, next_state = fetch_new_items(
+            feed_urls=config.feed_urls,
+            prior_state=prior_state,
+            run_started_at=datetime.now(timezone.utc),
+            config=config,
+            session=session,
+            metrics=metrics,
+        )
+    feeds = [f for f in metrics.feeds.values() if f.error is None]
+    latencies = [f.connect_seconds + f.fetch_seconds + f.parse_seconds for f in feeds]
+    record["feeds_per_sec"] = len(config.feed_urls) / record["seconds"]
+    record["items"] = len(items)
+    record["failures"] = len(failures)
+    record["p50_ms"] = (p50 * 1000) if (p50 := _percentile(latencies, 50)) is not None else None
+    record["p99_ms"] = (p99 * 1000) if (p99 := _percentile(latencies, 99)) is not None else None
+    record["parse_s"] = sum(f.parse_seconds for f in feeds)
+    record["bytes"] = sum(f.bytes for f in feeds)
+    next_state.last_run_utc = datetime.now(timezone.utc)
+    return items, next_state
+
+
+def _startup_stage(report: Report, name: str, argv: list[str], **env: str) -> None:
+    # A fresh interpreter under -X importtime, as cron would start it.
+    with report.stage(name) as record:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv],
+            env={**os.environ, "PYTHONPATH": _REPO_ROOT, **env},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    # Lines look like "import time: <self us> | <cumulative us> | <indented module>".
+    imported: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imported[parts[2].strip()] = int(parts[1]) if not parts[2].startswith("  ") else 0
+    record["import_ms"] = sum(imported.values()) / 1000
+    record["modules"] = len(imported)
+    record["heavy_modules"] = sum(name in imported for name in _HEAVY_MODULES)
+
+
+def run_benchmark(args: argparse.Namespace) -> Report:
+    report = Report()
+    server = FakeFeedServer(
+        FeedServerConfig(
+            feeds=args.feeds,
+            items_per_feed=args.items,
+            item_bytes=args.item_bytes,
+            latency_seconds=args.latency_ms / 1000,
+            error_rate=args.error_rate,
+            conditional=not args.no_304,
+            atom_ratio=args.atom_ratio,
+            hosts=args.hosts,
+        )
+    ).start()
+    sink = SmtpSink().start()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="rss-to-email-bench-") as workdir:
+            feed_list_path = os.path.join(workdir, "feeds.txt")
+            with open(feed_list_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(server.feed_urls()) + "\n")
+
+            os.environ.update(
+                {
+                    "SMTP_HOST": "127.0.0.1",
+                    "SMTP_PORT": str(sink.port),
+                    "SMTP_USERNAME": "bench",
+                    "SMTP_PASSWORD": "bench",
+                    "SMTP_FROM": "bench@example.invalid",
+                    "SMTP_TO": "bench@example.invalid",
+                    "SMTP_USE_TLS": "false",
+                    "SMTP_USE_SSL": "false",
+                }
+            )
+            config = load_config(
+                feed_list_path=feed_list_path, state_path=os.path.join(workdir, "state.json")
+            )
+            session = create_fetch_session(config)
+            try:
+                _items, state = _fetch_stage(
+                    report, "fetch (cold)", config=config, prior_state=State(last_run_utc=None, feeds={}), session=session
+                )
+                _items, state = _fetch_stage(
+                    report, "fetch (unchanged)", config=config, prior_state=state, session=session
+                )
+                updated = server.publish(args.update_ratio)
+                items, state = _fetch_stage(
+                    report, "fetch (updated)", config=config, prior_state=state, session=session
+                )
+                report.stages["fetch (updated)"]["updated_feeds"] = updated
+            finally:
+                session.close()
+
+            with report.stage("render_email", items=len(items)) as record:
+                _subject, text_body, html_body = render_email(
+                    items=items,
+                    failures=[],
+                    now_utc=datetime.now(timezone.utc),
+                    subject_prefix=config.mail_subject_prefix,
+                )
+            record["bytes"] = len(text_body) + len(html_body)
+
+            for suffix in ("json", "sqlite"):
+                path = os.path.join(workdir, f"bench-state.{suffix}")
+                with report.stage(f"save_state ({suffix})"):
+                    save_state(path, state)
+                with report.stage(f"load_state ({suffix})", bytes=os.path.getsize(path)):
+                    load_state(path)
+
+            # End to end: a warm-start run, then a run that finds new items and mails them.
+            sent_before = sink.messages
+            with report.stage("run_once (warm start)") as record:
+                result = run_once(feed_list_path=feed_list_path, state_path=config.state_path)
+            record.update({f"{k}_s": v for k, v in result.metrics.stages.items()})
+            server.publish(args.update_ratio, salt="run_once")
+            with report.stage("run_once (send)") as record:
+                result = run_once(feed_list_path=feed_list_path, state_path=config.state_path)
+            record.update({f"{k}_s": v for k, v in result.metrics.stages.items()})
+            record["messages"] = sink.messages - sent_before
+            record["mail_bytes"] = sink.bytes
+
+            # Cold start of `python -m rss_to_email`: the bare interpreter, importing the
+            # entry point, and a whole run on a state where no feed is due yet.
+            _startup_stage(report, "startup (interpreter)", ["-c", "pass"])
+            _startup_stage(report, "startup (import)", ["-c", "import rss_to_email.__main__"])
+            idle_state = load_state(config.state_path)
+            next_poll = datetime.now(timezone.utc) + timedelta(hours=1)
+            for url in list(idle_state.feeds):
+                idle_state.feeds[url] = replace(idle_state.feeds[url], next_poll_utc=next_poll)
+            idle_state_path = os.path.join(workdir, "idle-state.json")
+            save_state(idle_state_path, idle_state)
+            _startup_stage(
+                report,
+                "startup (nothing due)",
+                ["-m", "rss_to_email"],
+                FEED_LIST_PATH=feed_list_path,
+                STATE_PATH=idle_state_path,
+                ADAPTIVE_POLLING="true",
+            )
+    finally:
+        sink.stop()
+        server.stop()
+
+    report.server = {
+        "requests": server.requests,
+        "not_modified": server.not_modified,
+        "errors": server.errors,
+    }
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark rss-to-email against a local fake feed server and SMTP sink.",
+    )
+    parser.add_argument("--feeds", type=int, default=1000, help="Number of synthetic feeds.")
+    parser.add_argument("--items", type=int, default=20, help="Items per feed.")
+    parser.add_argument("--item-bytes", type=int, default=400, help="Approximate bytes per item.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Server-side delay per request.")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Fraction of feeds that return 503.")
+    parser.add_argument("--no-304", action="store_true", help="Ignore conditional request headers.")
+    parser.add_argument("--atom-ratio", type=float, default=0.5, help="Fraction of feeds served as Atom.")
+    parser.add_argument("--hosts", type=int, default=50, help="Distinct loopback hosts (127.0.1.x) to spread feeds over.")
+    parser.add_argument("--update-ratio", type=float, default=0.3, help="Fraction of feeds that publish between passes.")
+    parser.add_argument("--json", help="Also write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.hosts <= 254:
+        parser.error("--hosts must be between 1 and 254.")
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "ERROR").upper())
+
+    report = run_benchmark(args)
+    print(report.format())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "stages": report.stages, "server": report.server}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
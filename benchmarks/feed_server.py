@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+@dataclass
+class FeedServerConfig:
+    feeds: int
+    items_per_feed: int = 20
+    item_bytes: int = 200
+    latency_seconds: float = 0.0
+    error_rate: float = 0.0
+    conditional: bool = True
+    atom_ratio: float = 0.5
+    hosts: int = 1
+
+
+def _fraction(name: str, salt: str) -> float:
+    digest = hashlib.blake2b(f"{salt}:{name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class FakeFeedServer:
+    # Serves /feed/<n> as synthetic RSS 2.0 or Atom. The initial items are ten minutes
+    # apart and a day old; publish() adds one new item, stamped with the current time, to
+    # the top of some feeds, changing their body and ETag.
+
+    def __init__(self, config: FeedServerConfig) -> None:
+        self.config = config
+        self.base_time = time.time() - 86400
+        self.generations = [0] * config.feeds
+        self._published: list[list[float]] = [[] for _ in range(config.feeds)]
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._httpd.request_queue_size = 1024
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def feed_urls(self) -> list[str]:
+        # Spreading feeds over 127.0.1.x gives the fetcher distinct hosts to schedule.
+        return [
+            f"http://127.0.1.{n % self.config.hosts + 1}:{self.port}/feed/{n}"
+            for n in range(self.config.feeds)
+        ]
+
+    def start(self) -> "FakeFeedServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def publish(self, fraction: float, *, salt: str = "publish") -> int:
+        # Dates go out with one-second resolution; stamp new items in the next second so
+        # they are strictly newer than a run that finished just before publish().
+        now = float(int(time.time()) + 1)
+        updated = 0
+        for n in range(self.config.feeds):
+            if _fraction(str(n), f"{salt}:{self.generations[n]}") < fraction:
+                self.generations[n] += 1
+                self._published[n].append(now)
+                updated += 1
+        return updated
+
+    def _published_at(self, n: int, i: int) -> float:
+        count = self.config.items_per_feed
+        return self.base_time + i * 600 if i < count else self._published[n][i - count]
+
+    def body(self, n: int) -> bytes:
+        generation = self.generations[n]
+        count = self.config.items_per_feed
+        atom = _fraction(str(n), "atom") < self.config.atom_ratio
+        padding = "x" * max(0, self.config.item_bytes - 120)
+        parts: list[str] = []
+        for i in range(generation + count - 1, generation - 1, -1):
+            published = self._published_at(n, i)
+            title = escape(f"Feed {n} item {i}")
+            link = f"http://example.invalid/{n}/{i}"
+            if atom:
+                stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(published))
+                parts.append(
+                    f"<entry><id>urn:feed:{n}:{i}</id><title>{title}</title>"
+                    f'<link href="{link}"/><updated>{stamp}</updated>'
+                    f"<summary>{padding}</summary></entry>"
+                )
+            else:
+                parts.append(
+                    f"<item><guid>urn:feed:{n}:{i}</guid><title>{title}</title>"
+                    f"<link>{link}</link><pubDate>{formatdate(published, usegmt=True)}</pubDate>"
+                    f"<description>{padding}</description></item>"
+                )
+        items = "".join(parts)
+        if atom:
+            doc = (
+                '<?xml version="1.0" encoding="utf-8"?>'
+                f'<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed {n}</title>{items}</feed>'
+            )
+        else:
+            doc = (
+                '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+                f"<title>Feed {n}</title>{items}</channel></rss>"
+            )
+        return doc.encode()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", headers: dict[str, str] | None = None) -> None:
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                with server._lock:
+                    server.requests += 1
+                if server.config.latency_seconds:
+                    time.sleep(server.config.latency_seconds)
+
+                parts = self.path.strip("/").split("/")
+                if len(parts) != 2 or parts[0] != "feed" or not parts[1].isdigit():
+                    self._reply(404)
+                    return
+                n = int(parts[1])
+                if n >= server.config.feeds:
+                    self._reply(404)
+                    return
+                if _fraction(str(n), "error") < server.config.error_rate:
+                    with server._lock:
+                        server.errors += 1
+                    self._reply(503, headers={"Retry-After": "60"})
+                    return
+
+                etag = f'"{n}-{server.generations[n]}"'
+                if server.config.conditional and self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self._reply(304, headers={"ETag": etag})
+                    return
+                self._reply(
+                    200,
+                    server.body(n),
+                    {"Content-Type": "application/xml; charset=utf-8", "ETag": etag},
+                )
+
+        return Handler
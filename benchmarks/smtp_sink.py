@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import socketserver
+import threading
+
+
+class SmtpSink:
+    # Just enough of RFC 5321 for smtplib: EHLO, AUTH PLAIN, MAIL/RCPT/DATA, RSET, NOOP
+    # and QUIT. Messages are counted and discarded.
+
+    def __init__(self, *, pipelining: bool = True) -> None:
+        self.pipelining = pipelining
+        self.connections = 0
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "SmtpSink":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type[socketserver.StreamRequestHandler]:
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _send(self, line: str) -> None:
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self) -> None:
+                with sink._lock:
+                    sink.connections += 1
+                self._send("220 sink ESMTP")
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode(errors="replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self._send("250-sink")
+                        if sink.pipelining:
+                            self._send("250-PIPELINING")
+                        self._send("250 AUTH PLAIN")
+                    elif verb == "HELO":
+                        self._send("250 sink")
+                    elif verb == "AUTH":
+                        self._send("235 2.7.0 Authentication successful")
+                    elif verb in {"MAIL", "RCPT", "RSET", "NOOP"}:
+                        self._send("250 OK")
+                    elif verb == "DATA":
+                        self._send("354 End data with <CR><LF>.<CR><LF>")
+                        size = 0
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in {b".\r\n", b".\n"}:
+                                break
+                            size += len(line)
+                        with sink._lock:
+                            sink.messages += 1
+                            sink.bytes += size
+                        self._send("250 OK queued")
+                    elif verb == "QUIT":
+                        self._send("221 Bye")
+                        return
+                    else:
+                        self._send("502 Command not implemented")
+
+        return Handler
@@ -5,8 +5,10 @@ import logging
 import os
 import sys
 
-from rss_to_email.app import run_once
-from rss_to_email.scheduler import CronConfig, run_on_schedule
+from rss_to_email.checkpoint import RunLocked
+
+# Everything else is imported by the branch of main() that needs it: a one-shot run
+# started by cron shouldn't pay for croniter, the profiles code or the daemon.
 
 
 def _build_parser() -> argparse.ArgumentParser:
@@ -19,7 +21,31 @@ def _build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--state-path",
         default=os.environ.get("STATE_PATH") or os.environ.get("SQLITE_PATH"),
-        help="Path to JSON state file (or env STATE_PATH).",
+        help=(
+            "Path to state file (or env STATE_PATH); a .sqlite/.sqlite3/.db suffix "
+            "selects the SQLite backend, anything else is JSON."
+        ),
+    )
+    parser.add_argument(
+        "--profiles",
+        default=os.environ.get("PROFILES_PATH"),
+        help=(
+            "JSON file of profiles, each with its own feed list, state path and recipients, "
+            "sharing one fetch pass (or env PROFILES_PATH). Replaces --feed-list and --state-path."
+        ),
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help=(
+            "Instead of fetching, send one digest of everything the sharded workers "
+            "(SHARD_INDEX/SHARD_COUNT) have left in SPOOL_PATH."
+        ),
+    )
+    parser.add_argument(
+        "--migrate-state-from",
+        default=None,
+        help="Copy an existing state file (e.g. the old JSON one) into --state-path and exit.",
     )
     parser.add_argument(
         "--cron-schedule",
@@ -32,6 +58,32 @@ def _build_parser() -> argparse.ArgumentParser:
         default=os.environ.get("CRON_IMMEDIATE", "").strip().lower() in {"1", "true", "yes", "y", "on"},
         help="Run once at startup when scheduling (or env CRON_IMMEDIATE=true).",
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=os.environ.get("DAEMON_MODE", "").strip().lower() in {"1", "true", "yes", "y", "on"},
+        help=(
+            "With --cron-schedule, keep config, state and connections in memory between "
+            "runs (or env DAEMON_MODE=true)."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.environ["METRICS_PORT"]) if os.environ.get("METRICS_PORT") else None,
+        help=(
+            "With --cron-schedule, serve Prometheus metrics for the last run on this port "
+            "(or env METRICS_PORT)."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default=os.environ.get("METRICS_HOST") or "127.0.0.1",
+        help=(
+            "Address the metrics endpoint binds to; 0.0.0.0 exposes it on every "
+            "interface (or env METRICS_HOST, default 127.0.0.1)."
+        ),
+    )
     return parser
 
 
@@ -44,15 +96,34 @@ def main(argv: list[str] | None = None) -> int:
         format="%(asctime)s %(levelname)s %(message)s",
     )
 
-    if not args.feed_list:
-        logging.error("Missing feed list path; set --feed-list or FEED_LIST_PATH.")
-        return 2
-    if not args.state_path:
+    if not args.state_path and not (args.profiles and not args.migrate_state_from):
         logging.error("Missing state path; set --state-path or STATE_PATH.")
         return 2
 
+    if args.migrate_state_from:
+        from rss_to_email.state import migrate_state
+
+        try:
+            state = migrate_state(source_path=args.migrate_state_from, dest_path=args.state_path)
+        except Exception:
+            logging.exception("State migration failed.")
+            return 1
+        logging.info(
+            "Migrated state for %d feeds from %s to %s.",
+            len(state.feeds),
+            args.migrate_state_from,
+            args.state_path,
+        )
+        return 0
+
+    if not args.feed_list and not args.profiles:
+        logging.error("Missing feed list path; set --feed-list or FEED_LIST_PATH.")
+        return 2
+
     try:
         if args.cron_schedule:
+            from rss_to_email.scheduler import CronConfig, run_on_schedule
+
             run_on_schedule(
                 feed_list_path=args.feed_list,
                 state_path=args.state_path,
@@ -60,12 +131,30 @@ def main(argv: list[str] | None = None) -> int:
                     schedule=args.cron_schedule,
                     immediate=bool(args.cron_immediate),
                     max_sleep_seconds=float(os.environ.get("CRON_MAX_SLEEP_SECONDS", "60")),
+                    daemon=bool(args.daemon),
+                    metrics_port=args.metrics_port,
+                    metrics_host=args.metrics_host,
                 ),
+                profiles_path=args.profiles,
+                merge=args.merge,
             )
+        elif args.merge:
+            from rss_to_email.app import run_merge
+
+            run_merge(feed_list_path=args.feed_list, state_path=args.state_path)
+        elif args.profiles:
+            from rss_to_email.tenants import run_tenants
+
+            run_tenants(profiles_path=args.profiles)
         else:
+            from rss_to_email.app import run_once
+
             run_once(feed_list_path=args.feed_list, state_path=args.state_path)
     except KeyboardInterrupt:
         return 130
+    except RunLocked as exc:
+        logging.warning("Not running: %s", exc)
+        return 0
     except Exception:
         logging.exception("Run failed.")
         return 1
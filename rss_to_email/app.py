@@ -1,14 +1,28 @@
 from __future__ import annotations
 
 import logging
+import os
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterator
 
-from rss_to_email.config import load_config
-from rss_to_email.email_render import render_email
-from rss_to_email.feeds import FeedItem, fetch_new_items
-from rss_to_email.smtp_send import send_email
-from rss_to_email.state import State, load_state, save_state
+from rss_to_email.checkpoint import Journal, run_lock
+from rss_to_email.config import Config, load_config
+from rss_to_email.metrics import RunMetrics, write_run_report
+from rss_to_email.outbox import Outbox
+from rss_to_email.polling import should_fetch
+from rss_to_email.shards import load_shard_state
+from rss_to_email.spool import Spool
+from rss_to_email.state import State, canonical_feed_url, load_state, save_state
+
+# requests, feedparser, smtplib and the email package are imported where they are
+# first used, so a cron tick with nothing to do exits before loading any of them.
+if TYPE_CHECKING:
+    from rss_to_email.feeds import FeedItem
+    from rss_to_email.httpclient import FetchSession
+    from rss_to_email.parse_cache import ParseCache
+    from rss_to_email.smtp_send import SmtpPool
 
 
 @dataclass(frozen=True)
@@ -17,62 +31,355 @@ class RunResult:
     failures: list[str]
     state: State
     run_started_at: datetime
+    metrics: RunMetrics
+
+
+@dataclass(frozen=True)
+class MergeResult:
+    new_items: list[FeedItem]
+    failures: list[str]
+    batches: int
+    metrics: RunMetrics
+
 
+def load_run_state(config: Config) -> State:
+    if config.shard_count > 1:
+        return load_shard_state(config.state_path, config.feed_urls)
+    return load_state(config.state_path)
 
-def run_once(*, feed_list_path: str, state_path: str) -> None:
+
+def run_once(
+    *,
+    feed_list_path: str,
+    state_path: str,
+    session: FetchSession | None = None,
+    smtp: SmtpPool | None = None,
+    parse_cache: ParseCache | None = None,
+) -> RunResult:
+    # Raises RunLocked if another run on the same state is still going.
     config = load_config(feed_list_path=feed_list_path, state_path=state_path)
+    metrics = RunMetrics()
+    try:
+        with run_lock(config.state_path):
+            with metrics.stage("state_load"):
+                prior_state = load_run_state(config)
+            now = datetime.now(timezone.utc)
+            if not _has_work(config, prior_state, now):
+                # Nothing is saved, so last_run stays where the last real run left it.
+                logging.info("No feeds due and no mail queued; nothing to do.")
+                return RunResult([], [], prior_state, now, metrics)
+            return run_with_state(
+                config=config,
+                prior_state=prior_state,
+                session=session,
+                smtp=smtp,
+                metrics=metrics,
+                parse_cache=parse_cache,
+            )
+    finally:
+        if config.run_report_path:
+            write_run_report(config.run_report_path, metrics)
+
+
+def _has_work(config: Config, prior_state: State, now: datetime) -> bool:
+    # Whether a run would do anything besides moving last_run: fetch a feed, finish a
+    # killed run from its journal, or send queued mail.
+    if prior_state.last_run_utc is None:
+        return True
+    journal = Journal.from_config(config)
+    if journal is not None and os.path.exists(journal.path):
+        return True
+    outbox = Outbox.from_config(config) if not config.spool_path else None
+    if outbox is not None and outbox.due(now):
+        return True
+    feeds = prior_state.feeds
+    return any(
+        should_fetch(feeds.get(canonical_feed_url(feeds, url)), now, config)
+        for url in config.feed_urls
+    )
+
+
+def run_with_state(
+    *,
+    config: Config,
+    prior_state: State,
+    session: FetchSession | None = None,
+    smtp: SmtpPool | None = None,
+    metrics: RunMetrics | None = None,
+    parse_cache: ParseCache | None = None,
+) -> RunResult:
+    # The core of run_once for callers that keep config, state and connections around
+    # between runs. The returned state is what was saved to config.state_path. Callers
+    # hold run_lock(config.state_path), which also covers the run's journal.
+    from rss_to_email.feeds import fetch_new_items
 
+    if metrics is None:
+        metrics = RunMetrics()
     run_started_at = datetime.now(timezone.utc)
-    prior_state = load_state(config.state_path)
 
-    new_items, failures, next_state = fetch_new_items(
-        feed_urls=config.feed_urls,
+    journal = Journal.from_config(config)
+    try:
+        with metrics.stage("fetch"):
+            new_items, failures, next_state = fetch_new_items(
+                feed_urls=config.feed_urls,
+                prior_state=prior_state,
+                run_started_at=run_started_at,
+                config=config,
+                session=session,
+                metrics=metrics,
+                parse_cache=parse_cache,
+                journal=journal,
+            )
+        metrics.new_items = len(new_items)
+        metrics.failures = len(failures)
+        return deliver_and_save(
+            config=config,
+            prior_state=prior_state,
+            new_items=new_items,
+            failures=failures,
+            next_state=next_state,
+            run_started_at=run_started_at,
+            smtp=smtp,
+            metrics=metrics,
+            journal=journal,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def deliver_and_save(
+    *,
+    config: Config,
+    prior_state: State,
+    new_items: list[FeedItem],
+    failures: list[str],
+    next_state: State,
+    run_started_at: datetime,
+    smtp: SmtpPool | None,
+    metrics: RunMetrics,
+    journal: Journal | None = None,
+) -> RunResult:
+    # Everything after the fetch: mail the digest, then decide how far last_run may
+    # advance and save. With an outbox the digest is queued there before the save and
+    # sent afterwards, together with anything left over from earlier runs. A sharded
+    # worker (SPOOL_PATH set) leaves its items in the spool for run_merge instead. The
+    # journal is marked once the digest is out and removed once state is saved.
+    spool = Spool.from_config(config)
+    outbox = Outbox.from_config(config) if spool is None else None
+    result = _deliver_and_save(
+        config=config,
         prior_state=prior_state,
+        new_items=new_items,
+        failures=failures,
+        next_state=next_state,
         run_started_at=run_started_at,
-        config=config,
+        smtp=smtp,
+        metrics=metrics,
+        outbox=outbox,
+        spool=spool,
+        journal=journal,
     )
+    if journal is not None:
+        journal.discard()
+    if outbox is not None:
+        with metrics.stage("smtp"):
+            drain_outbox(outbox, smtp=smtp, config=config)
+    return result
+
+
+@contextmanager
+def _smtp_pool(smtp: SmtpPool | None, config: Config) -> Iterator[SmtpPool]:
+    # The caller's pool, or a temporary one closed afterwards.
+    if smtp is not None:
+        yield smtp
+        return
+    from rss_to_email.smtp_send import SmtpPool
+
+    pool = SmtpPool(config.smtp)
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
+def drain_outbox(outbox: Outbox, *, smtp: SmtpPool | None, config: Config) -> None:
+    with _smtp_pool(smtp, config) as pool:
+        outbox.drain(pool)
+
+
+def _deliver_and_save(
+    *,
+    config: Config,
+    prior_state: State,
+    new_items: list[FeedItem],
+    failures: list[str],
+    next_state: State,
+    run_started_at: datetime,
+    smtp: SmtpPool | None,
+    metrics: RunMetrics,
+    outbox: Outbox | None,
+    spool: Spool | None = None,
+    journal: Journal | None = None,
+) -> RunResult:
+    def save(state: State) -> None:
+        with metrics.stage("state_save"):
+            save_state(config.state_path, state)
 
     if prior_state.last_run_utc is None and not config.initial_run_send:
         logging.info(
             "Initial run: warm-starting (mark seen, set last_run, send nothing)."
         )
         next_state.last_run_utc = run_started_at
-        save_state(config.state_path, next_state)
-        return
+        save(next_state)
+        return RunResult(new_items, failures, next_state, run_started_at, metrics)
 
     if not new_items:
         logging.info("No new items.")
         if not failures:
             next_state.last_run_utc = run_started_at
-            save_state(config.state_path, next_state)
+            save(next_state)
         else:
-            save_state(config.state_path, next_state)
+            save(next_state)
             logging.warning(
                 "Feed failures occurred; not advancing last_run: %s", failures
             )
-        return
-
-    subject, text_body, html_body = render_email(
-        items=new_items,
-        failures=failures,
-        now_utc=run_started_at,
-        subject_prefix=config.mail_subject_prefix,
-    )
+        return RunResult(new_items, failures, next_state, run_started_at, metrics)
 
-    send_email(
-        smtp_config=config.smtp,
-        subject=subject,
-        text_body=text_body,
-        html_body=html_body,
-    )
+    if spool is not None:
+        with metrics.stage("spool"):
+            spool.put(
+                shard_index=config.shard_index,
+                run_started_at=run_started_at,
+                items=new_items,
+                failures=failures,
+            )
+        logging.info("Spooled %d new items to %s.", len(new_items), spool.path)
+    else:
+        _send_digest(
+            config=config,
+            items=new_items,
+            failures=failures,
+            now_utc=run_started_at,
+            smtp=smtp,
+            metrics=metrics,
+            outbox=outbox,
+        )
+    if journal is not None:
+        journal.mark_delivered()
 
     if failures:
-        save_state(config.state_path, next_state)
+        save(next_state)
         logging.warning(
             "Email sent, but not advancing last_run due to feed failures."
         )
-        return
+        return RunResult(new_items, failures, next_state, run_started_at, metrics)
 
     next_state.last_run_utc = run_started_at
-    save_state(config.state_path, next_state)
+    save(next_state)
     logging.info("Sent %d new items.", len(new_items))
+    return RunResult(new_items, failures, next_state, run_started_at, metrics)
+
+
+def _send_digest(
+    *,
+    config: Config,
+    items: list[FeedItem],
+    failures: list[str],
+    now_utc: datetime,
+    smtp: SmtpPool | None,
+    metrics: RunMetrics,
+    outbox: Outbox | None,
+) -> None:
+    from rss_to_email.email_render import render_digests
+    from rss_to_email.smtp_send import build_messages
+
+    with metrics.stage("render"):
+        digests = render_digests(
+            items=items,
+            failures=failures,
+            now_utc=now_utc,
+            subject_prefix=config.mail_subject_prefix,
+            max_items=config.digest_max_items,
+            max_items_per_domain=config.digest_max_items_per_domain,
+            max_bytes=config.digest_max_bytes,
+        )
+
+    messages = [
+        msg
+        for subject, text_body, html_body in digests
+        for msg in build_messages(
+            smtp_config=config.smtp,
+            subject=subject,
+            text_body=text_body,
+            html_body=html_body,
+        )
+    ]
+    if outbox is not None:
+        with metrics.stage("outbox"):
+            outbox.put(messages)
+        logging.info("Queued %d new items in outbox %s.", len(items), outbox.path)
+    else:
+        with metrics.stage("smtp"), _smtp_pool(smtp, config) as pool:
+            pool.deliver(messages)
+
+
+def run_merge(
+    *,
+    feed_list_path: str,
+    state_path: str,
+    smtp: SmtpPool | None = None,
+) -> MergeResult:
+    # The merge step of a sharded setup: one digest from every batch the workers have
+    # spooled so far. Batches that arrive later go into the next merge. As with a
+    # single process, failures alone are logged but not mailed.
+    config = load_config(feed_list_path=feed_list_path, state_path=state_path)
+    spool = Spool.from_config(config)
+    if spool is None:
+        raise ValueError("run_merge needs SPOOL_PATH.")
+    outbox = Outbox.from_config(config)
+    metrics = RunMetrics()
+    try:
+        with run_lock(os.path.join(spool.path, "merge")):
+            return _merge(config=config, spool=spool, outbox=outbox, smtp=smtp, metrics=metrics)
+    finally:
+        if config.run_report_path:
+            write_run_report(config.run_report_path, metrics)
+
+
+def _merge(
+    *,
+    config: Config,
+    spool: Spool,
+    outbox: Outbox | None,
+    smtp: SmtpPool | None,
+    metrics: RunMetrics,
+) -> MergeResult:
+    with metrics.stage("spool_load"):
+        batches = spool.batches()
+    items = [item for batch in batches for item in batch.items]
+    failures = [failure for batch in batches for failure in batch.failures]
+    metrics.new_items = len(items)
+    metrics.failures = len(failures)
+
+    if items:
+        _send_digest(
+            config=config,
+            items=items,
+            failures=failures,
+            now_utc=max(batch.run_started_at for batch in batches),
+            smtp=smtp,
+            metrics=metrics,
+            outbox=outbox,
+        )
+        logging.info("Merged %d new items from %d spooled batches.", len(items), len(batches))
+    elif failures:
+        logging.warning("No new items; spooled feed failures: %s", failures)
+    else:
+        logging.info("No new items.")
+    spool.remove([batch.id for batch in batches])
+
+    if outbox is not None:
+        with metrics.stage("smtp"):
+            drain_outbox(outbox, smtp=smtp, config=config)
+    return MergeResult(items, failures, len(batches), metrics)
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Executor
+from types import SimpleNamespace
+from typing import AsyncIterator, Container, Mapping
+
+import aiohttp
+
+from rss_to_email.config import Config
+from rss_to_email.download import BoundedBody
+from rss_to_email.feeds import (
+    FetchResult,
+    HostBreaker,
+    OnResult,
+    bounded_body,
+    build_fetch_result,
+    conditional_headers,
+    deadline_exceeded,
+    feed_host,
+    is_host_failure,
+    is_not_modified,
+    parse_body,
+    permanent_redirect_url,
+    streaming_parse,
+)
+from rss_to_email.httpclient import default_headers
+from rss_to_email.metrics import FeedMetrics, RunMetrics
+from rss_to_email.parse_cache import ParseCache
+from rss_to_email.state import FeedState
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def _fetch_feed(
+    *,
+    session: aiohttp.ClientSession,
+    host_limit: asyncio.Semaphore,
+    in_flight: asyncio.Semaphore,
+    breaker: HostBreaker,
+    url: str,
+    feed_state: FeedState | None,
+    seen: Container[str] | None,
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+) -> FetchResult:
+    host = feed_host(url)
+    async with host_limit, in_flight:
+        if breaker.is_open(host):
+            raise breaker.error(host)
+        try:
+            result = await _fetch_response(
+                session=session,
+                url=url,
+                feed_state=feed_state,
+                seen=seen,
+                config=config,
+                metrics=metrics,
+                parse_cache=parse_cache,
+                parse_pool=parse_pool,
+            )
+        except Exception as exc:
+            # aiohttp's disconnects and timeouts aren't OSErrors.
+            breaker.record(
+                host, failed=isinstance(exc, aiohttp.ClientConnectionError) or is_host_failure(exc)
+            )
+            raise
+        breaker.record(host, failed=False)
+        return result
+
+
+async def _iter_raw(resp: aiohttp.ClientResponse, body: BoundedBody) -> AsyncIterator[bytes]:
+    # Each read is cut short when the body's read deadline passes, however slowly the
+    # server is trickling bytes in.
+    while True:
+        try:
+            raw = await asyncio.wait_for(resp.content.read(_STREAM_CHUNK_SIZE), body.remaining())
+        except asyncio.TimeoutError:
+            # aiohttp's own read timeout is a TimeoutError too; leave that one be.
+            if body.remaining() == 0:
+                raise body.timed_out() from None
+            raise
+        if not raw:
+            return
+        yield raw
+
+
+async def _fetch_response(
+    *,
+    session: aiohttp.ClientSession,
+    url: str,
+    feed_state: FeedState | None,
+    seen: Container[str] | None,
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+) -> FetchResult:
+    # Started inside the host limit so queueing behind other feeds isn't counted.
+    # Parsing is CPU-bound, so it runs in the loop's default executor to keep the
+    # other fetches' sockets serviced meanwhile.
+    loop = asyncio.get_running_loop()
+    with metrics.feed(url) as record:
+        async with session.get(
+            url, headers=conditional_headers(feed_state), trace_request_ctx=record
+        ) as resp:
+            record.status = resp.status
+            moved = permanent_redirect_url(
+                [(hop.status, str(hop.url)) for hop in (*resp.history, resp)]
+            )
+            if is_not_modified(resp.status, feed_state):
+                return build_fetch_result(
+                    headers=resp.headers, parsed=None, feed_state=feed_state, permanent_url=moved
+                )
+            resp.raise_for_status()
+            body = bounded_body(resp.headers, config)
+            digest = pending = None
+            if config.parse_mode == "incremental":
+                stream = streaming_parse(feed_state=feed_state, seen=seen, config=config)
+                async for raw in _iter_raw(resp, body):
+                    chunk = body.decode(raw)
+                    record.bytes = body.size
+                    with record.parsing():
+                        if await loop.run_in_executor(None, stream.push, chunk):
+                            break
+                else:
+                    await loop.run_in_executor(None, stream.push, body.flush())
+                with record.parsing():
+                    parsed = await loop.run_in_executor(None, stream.finish)
+            else:
+                chunks = [
+                    body.decode(raw)
+                    async for raw in _iter_raw(resp, body)
+                ]
+                chunks.append(body.flush())
+                record.bytes = body.size
+                parsed, digest, pending = await loop.run_in_executor(
+                    None,
+                    functools.partial(
+                        parse_body,
+                        b"".join(chunks),
+                        feed_state=feed_state,
+                        parse_cache=parse_cache,
+                        parse_pool=parse_pool,
+                        record=record,
+                    ),
+                )
+    return build_fetch_result(
+        headers=resp.headers,
+        parsed=parsed,
+        feed_state=feed_state,
+        content_digest=digest,
+        pending_parse=pending,
+        permanent_url=moved,
+    )
+
+
+def _connect_trace() -> aiohttp.TraceConfig:
+    # Adds the time spent opening new connections (DNS, connect, TLS) to the feed
+    # record each request passes as its trace_request_ctx.
+    trace = aiohttp.TraceConfig()
+
+    async def started(
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateStartParams,
+    ) -> None:
+        ctx.connect_started = time.perf_counter()
+
+    async def ended(
+        session: aiohttp.ClientSession,
+        ctx: SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateEndParams,
+    ) -> None:
+        record: FeedMetrics = ctx.trace_request_ctx
+        record.connect_seconds += time.perf_counter() - ctx.connect_started
+
+    trace.on_connection_create_start.append(started)
+    trace.on_connection_create_end.append(ended)
+    return trace
+
+
+def _client_session(config: Config) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=0)
+    # Connect and per-read timeouts, like the requests timeout the threads engine uses.
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=config.http_timeout_seconds,
+        sock_read=config.http_timeout_seconds,
+    )
+    # Bodies are decoded by BoundedBody, which enforces MAX_FEED_BYTES as it inflates.
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers=default_headers(config),
+        auto_decompress=False,
+        trace_configs=[_connect_trace()],
+    )
+
+
+async def _fetch_all(
+    *,
+    session: aiohttp.ClientSession,
+    feed_urls: list[str],
+    feeds: Mapping[str, FeedState],
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    on_result: OnResult | None = None,
+    seen_by: Mapping[str, Container[str]] | None = None,
+) -> dict[str, FetchResult | Exception]:
+    unique_urls = list(dict.fromkeys(feed_urls))
+    breaker = HostBreaker(config.host_failure_threshold)
+    host_limits = {
+        host: asyncio.Semaphore(config.fetch_per_host_limit)
+        for host in {feed_host(url) for url in unique_urls}
+    }
+    # ASYNC_MAX_IN_FLIGHT is enforced here rather than by the connector, so a feed
+    # waiting its turn hasn't started its request (or its timeouts) yet.
+    in_flight = asyncio.Semaphore(config.async_max_in_flight)
+
+    tasks = {
+        asyncio.create_task(
+            _fetch_feed(
+                session=session,
+                host_limit=host_limits[feed_host(url)],
+                in_flight=in_flight,
+                breaker=breaker,
+                url=url,
+                feed_state=feeds.get(url),
+                seen=seen_by.get(url) if seen_by is not None else None,
+                config=config,
+                metrics=metrics,
+                parse_cache=parse_cache,
+                parse_pool=parse_pool,
+            )
+        ): url
+        for url in unique_urls
+    }
+    if not tasks:
+        return {}
+    if on_result is not None:
+        # Done callbacks run on the loop, one at a time, as each fetch finishes.
+        def report(task: asyncio.Task[FetchResult]) -> None:
+            if not task.cancelled():
+                exc = task.exception()
+                on_result(tasks[task], exc if exc is not None else task.result())
+
+        for task in tasks:
+            task.add_done_callback(report)
+    done, pending = await asyncio.wait(tasks, timeout=config.fetch_deadline_seconds)
+
+    results: dict[str, FetchResult | Exception] = {}
+    for task in done:
+        exc = task.exception()
+        results[tasks[task]] = exc if exc is not None else task.result()
+
+    if pending:
+        logging.warning(
+            "Fetch deadline of %.1fs exceeded; %d feeds unfinished.",
+            config.fetch_deadline_seconds,
+            len(pending),
+        )
+        for task in pending:
+            task.cancel()
+            results[tasks[task]] = deadline_exceeded(config)
+        await asyncio.gather(*pending, return_exceptions=True)
+    return results
+
+
+class AsyncSession:
+    # The asyncio engine's counterpart to a long-lived requests.Session: an event loop
+    # and an aiohttp session kept open between runs, so a daemon or scheduler reuses
+    # keep-alive connections and resolved addresses from one tick to the next. The
+    # aiohttp session is bound to the loop, so every fetch runs on this one.
+
+    def __init__(self, config: Config) -> None:
+        self._config = config
+        self._runner = asyncio.Runner()
+        self._session: aiohttp.ClientSession | None = None
+
+    def fetch_all(
+        self,
+        *,
+        feed_urls: list[str],
+        feeds: Mapping[str, FeedState],
+        config: Config,
+        metrics: RunMetrics,
+        parse_cache: ParseCache | None,
+        parse_pool: Executor | None,
+        on_result: OnResult | None = None,
+        seen_by: Mapping[str, Container[str]] | None = None,
+    ) -> dict[str, FetchResult | Exception]:
+        if self._session is None:
+            self._session = self._runner.run(self._open())
+        return self._runner.run(
+            _fetch_all(
+                session=self._session,
+                feed_urls=feed_urls,
+                feeds=feeds,
+                config=config,
+                metrics=metrics,
+                parse_cache=parse_cache,
+                parse_pool=parse_pool,
+                on_result=on_result,
+                seen_by=seen_by,
+            )
+        )
+
+    async def _open(self) -> aiohttp.ClientSession:
+        # Created on the runner's loop, which aiohttp ties it to.
+        return _client_session(self._config)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._runner.run(self._session.close())
+            self._session = None
+        self._runner.close()
+
+
+def fetch_all_async(
+    *,
+    feed_urls: list[str],
+    feeds: Mapping[str, FeedState],
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    on_result: OnResult | None = None,
+    seen_by: Mapping[str, Container[str]] | None = None,
+) -> dict[str, FetchResult | Exception]:
+    # One run on its own loop and session, for callers that don't keep one around.
+    session = AsyncSession(config)
+    try:
+        return session.fetch_all(
+            feed_urls=feed_urls,
+            feeds=feeds,
+            config=config,
+            metrics=metrics,
+            parse_cache=parse_cache,
+            parse_pool=parse_pool,
+            on_result=on_result,
+            seen_by=seen_by,
+        )
+    finally:
+        session.close()
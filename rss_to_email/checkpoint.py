@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, TextIO
+
+from rss_to_email.config import Config
+from rss_to_email.util import write_atomic
+
+
+class RunLocked(RuntimeError):
+    pass
+
+
+@contextmanager
+def run_lock(path: str) -> Iterator[None]:
+    # Held for a whole run, so a cron job that fires while the previous run (or a
+    # scheduler using the same state) is still going gives up instead of repeating its
+    # work. flock is per host: shards on different machines need their own state paths.
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RunLocked(f"Another run holds {lock_path}.") from None
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class Journal:
+    # Progress of the current run, next to the state file: a header naming the state
+    # the run started from, one JSON line per finished feed, and a "delivered" line once
+    # the digest has been sent. A run that completes deletes it after saving state; one
+    # that is killed leaves it for the next run to resume from. Lines are fsynced at
+    # most every interval_seconds, and whenever the digest goes out.
+
+    def __init__(self, path: str, *, interval_seconds: float) -> None:
+        self.path = path
+        self._interval_seconds = interval_seconds
+        self._file: TextIO | None = None
+        self._synced_at = 0.0
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Journal | None":
+        if config.checkpoint_seconds <= 0:
+            return None
+        return cls(f"{config.state_path}.journal", interval_seconds=config.checkpoint_seconds)
+
+    def _read(self, started_from: str | None) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        delivered: list[dict[str, Any]] = []
+        pending: list[dict[str, Any]] = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = iter(f)
+                header = json.loads(next(lines, "null"))
+                if not isinstance(header, dict) or header.get("started_from") != started_from:
+                    logging.info("Ignoring journal %s from another run.", self.path)
+                    return [], []
+                for line in lines:
+                    try:
+                        raw = json.loads(line)
+                    except ValueError:
+                        break  # The line being written when the run was killed.
+                    if raw.get("delivered"):
+                        delivered.extend(pending)
+                        pending = []
+                    else:
+                        pending.append(raw)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            logging.warning("Ignoring unreadable journal %s.", self.path)
+            return [], []
+        return delivered, pending
+
+    def resume(
+        self, *, started_from: str | None
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        # Opens the journal for a run starting from the state identified by started_from.
+        # Returns the feed entries a killed run from that same state left behind: those
+        # whose digest was already sent, and those still to be sent.
+        delivered, pending = self._read(started_from)
+        lines = [{"started_from": started_from}, *delivered]
+        if delivered:
+            lines.append({"delivered": True})
+        lines.extend(pending)
+        # Rewritten rather than appended to, which also drops a torn last line.
+        write_atomic(self.path, "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8"))
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._synced_at = time.monotonic()
+        return delivered, pending
+
+    def _sync(self) -> None:
+        assert self._file is not None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_at = time.monotonic()
+
+    def record(self, entry: dict[str, Any]) -> None:
+        assert self._file is not None
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        if time.monotonic() - self._synced_at >= self._interval_seconds:
+            self._sync()
+
+    def mark_delivered(self) -> None:
+        assert self._file is not None
+        self._file.write(json.dumps({"delivered": True}) + "\n")
+        self._sync()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -4,6 +4,7 @@ import os
 from dataclasses import dataclass
 from typing import Final
 
+from rss_to_email.shards import shard_feed_urls, shard_state_path
 from rss_to_email.util import parse_bool, read_feed_list
 
 
@@ -17,6 +18,8 @@ class SmtpConfig:
     use_ssl: bool
     mail_from: str
     mail_to: str
+    connections: int = 1
+    max_messages_per_connection: int = 100
 
 
 @dataclass(frozen=True)
@@ -26,17 +29,48 @@ class Config:
     feed_urls: list[str]
     user_agent: str
     http_timeout_seconds: float
+    fetch_workers: int
+    fetch_per_host_limit: int
+    fetch_deadline_seconds: float | None
+    max_feed_bytes: int | None
+    feed_read_deadline_seconds: float | None
+    http_pool_hosts: int
+    fetch_engine: str
+    async_max_in_flight: int
     max_items_per_feed: int | None
+    parse_mode: str
+    stop_after_seen: int
+    parse_cache_entries: int
+    parse_workers: int
     seen_uids_per_feed_limit: int
+    seen_uids_mode: str
+    seen_hashes_per_feed_limit: int
+    adaptive_polling: bool
+    poll_min_interval_seconds: float
+    poll_max_interval_seconds: float
+    failure_backoff_base_seconds: float
+    failure_backoff_max_seconds: float
+    host_failure_threshold: int
     initial_run_send: bool
     mail_subject_prefix: str
+    digest_max_items: int | None
+    digest_max_items_per_domain: int | None
+    digest_max_bytes: int | None
+    run_report_path: str | None
+    outbox_path: str | None
+    outbox_retry_base_seconds: float
+    outbox_retry_max_seconds: float
+    shard_index: int
+    shard_count: int
+    spool_path: str | None
+    checkpoint_seconds: float
     smtp: SmtpConfig
 
 
 _DEFAULT_UA: Final[str] = "rss-to-email/0.1"
 
 
-def load_config(*, feed_list_path: str, state_path: str) -> Config:
+def load_config(*, feed_list_path: str, state_path: str, mail_to: str | None = None) -> Config:
     feed_urls = read_feed_list(feed_list_path)
     if not feed_urls:
         raise ValueError(f"No feed URLs found in {feed_list_path!r}.")
@@ -46,7 +80,7 @@ def load_config(*, feed_list_path: str, state_path: str) -> Config:
     smtp_username = os.environ["SMTP_USERNAME"]
     smtp_password = os.environ["SMTP_PASSWORD"]
     smtp_from = os.environ["SMTP_FROM"]
-    smtp_to = os.environ["SMTP_TO"]
+    smtp_to = mail_to if mail_to is not None else os.environ["SMTP_TO"]
 
     smtp_use_ssl = parse_bool(os.environ.get("SMTP_USE_SSL", "false"))
     smtp_use_tls = parse_bool(os.environ.get("SMTP_USE_TLS", "true"))
@@ -56,16 +90,79 @@ def load_config(*, feed_list_path: str, state_path: str) -> Config:
     max_items_raw = os.environ.get("MAX_ITEMS_PER_FEED")
     max_items = int(max_items_raw) if max_items_raw else None
 
+    parse_mode = os.environ.get("PARSE_MODE", "full").strip().lower()
+    if parse_mode not in {"full", "incremental"}:
+        raise ValueError(f"Invalid PARSE_MODE {parse_mode!r}; expected 'full' or 'incremental'.")
+
+    seen_uids_mode = os.environ.get("SEEN_UIDS_MODE", "full").strip().lower()
+    if seen_uids_mode not in {"full", "hashed"}:
+        raise ValueError(f"Invalid SEEN_UIDS_MODE {seen_uids_mode!r}; expected 'full' or 'hashed'.")
+
+    fetch_workers = int(os.environ.get("FETCH_WORKERS", "8"))
+    fetch_per_host_limit = int(os.environ.get("FETCH_PER_HOST_LIMIT", "2"))
+    if fetch_workers < 1 or fetch_per_host_limit < 1:
+        raise ValueError("FETCH_WORKERS and FETCH_PER_HOST_LIMIT must be at least 1.")
+
+    fetch_engine = os.environ.get("FETCH_ENGINE", "threads").strip().lower()
+    if fetch_engine not in {"threads", "asyncio"}:
+        raise ValueError(f"Invalid FETCH_ENGINE {fetch_engine!r}; expected 'threads' or 'asyncio'.")
+
+    deadline_raw = os.environ.get("FETCH_DEADLINE_SECONDS")
+    fetch_deadline = float(deadline_raw) if deadline_raw else None
+
+    shard_index = int(os.environ.get("SHARD_INDEX", "0"))
+    shard_count = int(os.environ.get("SHARD_COUNT", "1"))
+    spool_path = os.environ.get("SPOOL_PATH") or None
+    if not 0 <= shard_index < shard_count:
+        raise ValueError("SHARD_INDEX must be between 0 and SHARD_COUNT - 1.")
+    if shard_count > 1:
+        if spool_path is None:
+            raise ValueError("SHARD_COUNT > 1 needs SPOOL_PATH for the merge step.")
+        # Each shard fetches its own slice of the list and keeps its own state file.
+        feed_urls = shard_feed_urls(feed_urls, index=shard_index, count=shard_count)
+        state_path = shard_state_path(state_path, shard_index)
+
     return Config(
         feed_list_path=feed_list_path,
         state_path=state_path,
         feed_urls=feed_urls,
         user_agent=os.environ.get("USER_AGENT", _DEFAULT_UA),
         http_timeout_seconds=float(os.environ.get("HTTP_TIMEOUT_SECONDS", "20")),
+        fetch_workers=fetch_workers,
+        fetch_per_host_limit=fetch_per_host_limit,
+        fetch_deadline_seconds=fetch_deadline,
+        max_feed_bytes=int(os.environ.get("MAX_FEED_BYTES", "20000000")) or None,
+        feed_read_deadline_seconds=float(os.environ.get("FEED_READ_DEADLINE_SECONDS", "60")) or None,
+        http_pool_hosts=int(os.environ.get("HTTP_POOL_HOSTS", "256")),
+        fetch_engine=fetch_engine,
+        async_max_in_flight=int(os.environ.get("ASYNC_MAX_IN_FLIGHT", "1000")),
         max_items_per_feed=max_items,
+        parse_mode=parse_mode,
+        stop_after_seen=int(os.environ.get("STOP_AFTER_SEEN", "20")),
+        parse_cache_entries=int(os.environ.get("PARSE_CACHE_ENTRIES", "512")),
+        parse_workers=int(os.environ.get("PARSE_WORKERS", "0")),
         seen_uids_per_feed_limit=int(os.environ.get("SEEN_UIDS_PER_FEED_LIMIT", "2000")),
+        seen_uids_mode=seen_uids_mode,
+        seen_hashes_per_feed_limit=int(os.environ.get("SEEN_HASHES_PER_FEED_LIMIT", "100000")),
+        adaptive_polling=parse_bool(os.environ.get("ADAPTIVE_POLLING", "false")),
+        poll_min_interval_seconds=float(os.environ.get("POLL_MIN_INTERVAL_SECONDS", "0")),
+        poll_max_interval_seconds=float(os.environ.get("POLL_MAX_INTERVAL_SECONDS", "86400")),
+        failure_backoff_base_seconds=float(os.environ.get("FAILURE_BACKOFF_BASE_SECONDS", "300")),
+        failure_backoff_max_seconds=float(os.environ.get("FAILURE_BACKOFF_MAX_SECONDS", "86400")),
+        host_failure_threshold=int(os.environ.get("HOST_FAILURE_THRESHOLD", "3")),
         initial_run_send=parse_bool(os.environ.get("INITIAL_RUN_SEND", "false")),
         mail_subject_prefix=os.environ.get("MAIL_SUBJECT_PREFIX", "RSS updates"),
+        digest_max_items=int(os.environ.get("DIGEST_MAX_ITEMS", "0")) or None,
+        digest_max_items_per_domain=int(os.environ.get("DIGEST_MAX_ITEMS_PER_DOMAIN", "0")) or None,
+        digest_max_bytes=int(os.environ.get("DIGEST_MAX_BYTES", "5000000")) or None,
+        run_report_path=os.environ.get("RUN_REPORT_PATH") or None,
+        outbox_path=os.environ.get("OUTBOX_PATH") or None,
+        outbox_retry_base_seconds=float(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", "60")),
+        outbox_retry_max_seconds=float(os.environ.get("OUTBOX_RETRY_MAX_SECONDS", "21600")),
+        shard_index=shard_index,
+        shard_count=shard_count,
+        spool_path=spool_path,
+        checkpoint_seconds=float(os.environ.get("CHECKPOINT_SECONDS", "10")),
         smtp=SmtpConfig(
             host=smtp_host,
             port=smtp_port,
@@ -75,5 +172,9 @@ def load_config(*, feed_list_path: str, state_path: str) -> Config:
             use_ssl=smtp_use_ssl,
             mail_from=smtp_from,
             mail_to=smtp_to,
+            connections=int(os.environ.get("SMTP_CONNECTIONS", "1")),
+            max_messages_per_connection=int(
+                os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")
+            ),
         ),
     )
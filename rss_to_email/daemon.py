@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import os
+
+from rss_to_email.app import RunResult, drain_outbox, load_run_state, run_with_state
+from rss_to_email.checkpoint import run_lock
+from rss_to_email.config import Config, load_config
+from rss_to_email.httpclient import FetchSession, create_fetch_session
+from rss_to_email.metrics import RunMetrics, write_run_report
+from rss_to_email.outbox import Outbox
+from rss_to_email.parse_cache import ParseCache
+from rss_to_email.smtp_send import SmtpPool
+from rss_to_email.state import State
+
+
+def _file_signature(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Daemon:
+    # Keeps config, state and HTTP/SMTP connections warm across scheduler ticks. The
+    # feed list is re-read only when its mtime changes, and state is re-read only if
+    # something other than this process wrote it. Because the in-memory state is a
+    # copy-on-write view, each tick only writes the feeds it touched (SQLite backend).
+
+    def __init__(self, *, feed_list_path: str, state_path: str) -> None:
+        self._feed_list_path = feed_list_path
+        self._state_path = state_path
+        self._config: Config | None = None
+        self._feed_list_signature: tuple[int, int] | None = None
+        self._state: State | None = None
+        self._state_signature: tuple[int, int] | None = None
+        self._session: FetchSession | None = None
+        self._smtp: SmtpPool | None = None
+        self._parse_cache: ParseCache | None = None
+
+    def _current_config(self) -> Config:
+        signature = _file_signature(self._feed_list_path)
+        if self._config is None or signature != self._feed_list_signature:
+            if self._config is not None:
+                logging.info("Feed list %s changed; reloading.", self._feed_list_path)
+            self._config = load_config(
+                feed_list_path=self._feed_list_path, state_path=self._state_path
+            )
+            self._feed_list_signature = signature
+            if self._session is None:
+                self._session = create_fetch_session(self._config)
+            if self._smtp is None:
+                self._smtp = SmtpPool(self._config.smtp)
+            if self._parse_cache is None:
+                self._parse_cache = ParseCache(self._config.parse_cache_entries)
+        return self._config
+
+    def _current_state(self, config: Config) -> State:
+        signature = _file_signature(config.state_path)
+        if self._state is None or signature != self._state_signature:
+            if self._state is not None:
+                logging.info("State %s changed on disk; reloading.", config.state_path)
+            self._state = load_run_state(config)
+            self._state_signature = signature
+        return self._state
+
+    def tick(self) -> RunResult:
+        config = self._current_config()
+        metrics = RunMetrics()
+        with run_lock(config.state_path):
+            with metrics.stage("state_load"):
+                prior_state = self._current_state(config)
+            try:
+                result = run_with_state(
+                    config=config,
+                    prior_state=prior_state,
+                    session=self._session,
+                    smtp=self._smtp,
+                    metrics=metrics,
+                    parse_cache=self._parse_cache,
+                )
+            except Exception:
+                # The save may or may not have landed; start from disk next time.
+                self._state = None
+                raise
+            finally:
+                if config.run_report_path:
+                    write_run_report(config.run_report_path, metrics)
+            self._state = result.state
+            self._state_signature = _file_signature(config.state_path)
+        return result
+
+    def drain_outbox(self) -> None:
+        config = self._current_config()
+        outbox = Outbox.from_config(config)
+        if outbox is not None:
+            drain_outbox(outbox, smtp=self._smtp, config=config)
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            self._smtp.close()
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import time
+import zlib
+from typing import Any
+
+# brotli can't be told to stop after N output bytes, but one meta-block inflates to at
+# most 16 MiB, and this many input bytes can't hold more than a couple of them.
+_BROTLI_SLICE = 64
+
+
+class FeedTooLarge(ValueError):
+    pass
+
+
+class FeedReadTimeout(TimeoutError):
+    pass
+
+
+def _content_length(value: str | int | None) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class BoundedBody:
+    # Decodes a response body (Content-Encoding gzip, deflate or br) chunk by chunk as
+    # it arrives, failing as soon as the decoded size passes max_bytes or the read runs
+    # past its deadline. Doing the decoding here rather than in urllib3/aiohttp means a
+    # decompression bomb is stopped before it is inflated: zlib is asked for no more
+    # than the bytes still allowed, and brotli is fed a few bytes at a time.
+
+    def __init__(
+        self,
+        *,
+        content_encoding: str | None,
+        content_length: str | int | None,
+        max_bytes: int | None,
+        read_deadline_seconds: float | None,
+    ) -> None:
+        self.size = 0
+        self._max_bytes = max_bytes
+        self._read_deadline_seconds = read_deadline_seconds
+        self._deadline = (
+            time.monotonic() + read_deadline_seconds if read_deadline_seconds else None
+        )
+        self._encoding = (content_encoding or "").strip().lower()
+        self._zlib: Any = None
+        self._brotli: Any = None
+        self._decode_errors: tuple[type[Exception], ...] = (zlib.error,)
+        if self._encoding == "br":
+            import brotli
+
+            self._brotli = brotli.Decompressor()
+            self._decode_errors = (brotli.error,)
+
+        length = _content_length(content_length)
+        if max_bytes is not None and length is not None and length > max_bytes:
+            raise self._too_large(f"Content-Length is {length}")
+
+    def _too_large(self, detail: str) -> FeedTooLarge:
+        return FeedTooLarge(f"body larger than {self._max_bytes} bytes ({detail})")
+
+    def _count(self, data: bytes) -> bytes:
+        self.size += len(data)
+        if self._max_bytes is not None and self.size > self._max_bytes:
+            raise self._too_large(f"{self._encoding or 'identity'} encoding")
+        return data
+
+    def _room(self) -> int:
+        # zlib's max_length; 0 means no limit. One byte over is enough to fail.
+        return self._max_bytes - self.size + 1 if self._max_bytes is not None else 0
+
+    def _inflate(self, data: bytes) -> bytes:
+        out: list[bytes] = []
+        while data:
+            if self._zlib is None:
+                if self._encoding == "deflate" and not _has_zlib_header(data):
+                    wbits = -zlib.MAX_WBITS  # Raw deflate, as some servers send.
+                else:
+                    wbits = 32 + zlib.MAX_WBITS  # gzip or zlib header.
+                self._zlib = zlib.decompressobj(wbits)
+            out.append(self._count(self._zlib.decompress(data, self._room())))
+            data = b""
+            if self._zlib.eof:
+                # Concatenated gzip members; anything else after the end is ignored.
+                data = self._zlib.unused_data
+                self._zlib = None
+                if not data.startswith(b"\x1f\x8b"):
+                    break
+        return b"".join(out)
+
+    def _unbrotli(self, data: bytes) -> bytes:
+        step = _BROTLI_SLICE if self._max_bytes is not None else max(1, len(data))
+        return b"".join(
+            self._count(self._brotli.process(data[i : i + step]))
+            for i in range(0, len(data), step)
+        )
+
+    def remaining(self) -> float | None:
+        # Seconds left until the read deadline, to bound a read that may block.
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def timed_out(self) -> FeedReadTimeout:
+        return FeedReadTimeout(f"body not read within {self._read_deadline_seconds}s")
+
+    def decode(self, data: bytes) -> bytes:
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise self.timed_out()
+        try:
+            if self._brotli is not None:
+                return self._unbrotli(data)
+            if self._encoding in {"gzip", "x-gzip", "deflate"}:
+                return self._inflate(data)
+        except self._decode_errors as exc:
+            raise ValueError(f"could not decode {self._encoding} body: {exc}") from exc
+        # identity, or an encoding we didn't ask for: passed through as before.
+        return self._count(data)
+
+    def flush(self) -> bytes:
+        if self._zlib is None:
+            return b""
+        try:
+            return self._count(self._zlib.flush())
+        except zlib.error as exc:
+            raise ValueError(f"could not decode {self._encoding} body: {exc}") from exc
+
+
+def _has_zlib_header(data: bytes) -> bool:
+    return len(data) >= 2 and data[0] & 0x0F == 8 and int.from_bytes(data[:2], "big") % 31 == 0
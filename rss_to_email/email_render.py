@@ -1,11 +1,52 @@
 from __future__ import annotations
 
+import io
 from collections import defaultdict
 from datetime import datetime
 from html import escape
 
 from rss_to_email.feeds import FeedItem
 
+# Every style lives once in <style>; elements only carry class names.
+_STYLE = (
+    "body{font-family:-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif;line-height:1.4}"
+    "h1{margin:0 0 8px 0}"
+    "h2{margin:20px 0 8px 0}"
+    ".summary{color:#555;margin:0 0 16px 0}"
+    "ol{margin:0;padding-left:22px}"
+    "ol li{margin:8px 0}"
+    "a{color:#0b57d0;text-decoration:none}"
+    ".meta{color:#666;font-size:12px;margin-top:2px}"
+    ".more{color:#666;font-style:italic;margin:8px 0 0 0}"
+    ".failures{margin:0;padding-left:18px;color:#a00}"
+)
+
+# Fragments are %-formatted straight into the output buffers; positional %s is by far
+# the cheapest substitution per item.
+_HTML_HEAD = (
+    "<!doctype html>\n"
+    "<html>\n"
+    "<head>\n"
+    '<meta charset="utf-8"/>\n'
+    '<meta name="viewport" content="width=device-width, initial-scale=1"/>\n'
+    "<title>%s</title>\n"
+    "<style>" + _STYLE + "</style>\n"
+    "</head>\n"
+    "<body>\n"
+    "<h1>%s</h1>\n"
+    '<div class="summary">%s • %s</div>\n'
+)  # title, prefix, date, count
+_HTML_DOMAIN_OPEN = "<h2>%s</h2>\n<ol>\n"
+_HTML_DOMAIN_CLOSE = "</ol>\n"
+_HTML_ITEM = "<li>%s%s</li>\n"  # title or link, meta
+_HTML_LINK = '<a href="%s">%s</a>'  # href, title
+_HTML_META = '<div class="meta">%s</div>'
+_HTML_MORE = '<p class="more">%s</p>\n'
+_HTML_FAILURES_OPEN = '<h2>Failures</h2>\n<ul class="failures">\n'
+_HTML_FAILURE = "<li>%s</li>\n"
+_HTML_FAILURES_CLOSE = "</ul>\n"
+_HTML_TAIL = "</body></html>\n"
+
 
 def _fmt_dt(dt: datetime | None) -> str:
     if dt is None:
@@ -13,75 +54,185 @@ def _fmt_dt(dt: datetime | None) -> str:
     return dt.strftime("%Y-%m-%d %H:%M UTC")
 
 
-def render_email(
+def _item_fragments(item: FeedItem) -> tuple[str, str]:
+    title = item.entry_title or item.entry_link or item.entry_uid
+    link = item.entry_link or ""
+    published = _fmt_dt(item.published_utc)
+
+    text = f"- {title}\n"
+    if link:
+        text += f"  {link}\n"
+    if published:
+        text += f"  {published}\n"
+
+    meta = " • ".join(x for x in [escape(item.feed_title or ""), escape(published)] if x)
+    title_html = _HTML_LINK % (escape(link), escape(title)) if link else escape(title)
+    html = _HTML_ITEM % (title_html, _HTML_META % meta if meta else "")
+    return text, html
+
+
+class _Part:
+    # One message's bodies, written as they are produced. The header is added last,
+    # once the number of parts is known.
+
+    def __init__(self, *, track_size: bool) -> None:
+        self.text = io.StringIO()
+        self.html = io.StringIO()
+        self.size = 0
+        self.items = 0
+        self._track_size = track_size
+
+    def write(self, text: str, html: str) -> None:
+        self.text.write(text)
+        self.html.write(html)
+        if self._track_size:
+            self.size += _encoded_size(text, html)
+
+
+def _encoded_size(text: str, html: str) -> int:
+    return len(text.encode("utf-8")) + len(html.encode("utf-8"))
+
+
+def _shown_items(
+    by_domain: dict[str, list[FeedItem]],
+    *,
+    now_utc: datetime,
+    max_items: int | None,
+    max_items_per_domain: int | None,
+) -> dict[str, list[FeedItem]]:
+    # The newest items win when a cap applies; order within a domain is kept.
+    shown = {
+        domain: domain_items[-max_items_per_domain:] if max_items_per_domain else domain_items
+        for domain, domain_items in by_domain.items()
+    }
+    flat = [item for domain_items in shown.values() for item in domain_items]
+    if max_items and len(flat) > max_items:
+        newest = sorted(flat, key=lambda item: item.published_utc or now_utc)[-max_items:]
+        keep = {id(item) for item in newest}
+        shown = {
+            domain: [item for item in domain_items if id(item) in keep]
+            for domain, domain_items in shown.items()
+        }
+    return shown
+
+
+def _write_failures(parts: list[_Part], failures: list[str], budget: int | None) -> None:
+    # Failures count against the budget like items. The block starts a part of its own
+    # when it doesn't fit in the last one, and is cut short with an "N more" line when
+    # it wouldn't fit in any part.
+    fragments = [(f"- {failure}\n", _HTML_FAILURE % escape(failure)) for failure in failures]
+    frame = _encoded_size("Failures:\n", _HTML_FAILURES_OPEN + _HTML_FAILURES_CLOSE)
+    part = parts[-1]
+    if budget is not None and part.items:
+        block = frame + sum(_encoded_size(text, html) for text, html in fragments)
+        if part.size + block > budget:
+            part = _Part(track_size=True)
+            parts.append(part)
+
+    more = f"… and {len(failures)} more failures"
+    reserve = frame + _encoded_size(f"- {more}\n", _HTML_FAILURE % escape(more))
+    part.write("Failures:\n", _HTML_FAILURES_OPEN)
+    for n, (text, html) in enumerate(fragments):
+        if budget is not None and part.size + _encoded_size(text, html) + reserve > budget:
+            more = f"… and {len(failures) - n} more failures"
+            part.write(f"- {more}\n", _HTML_FAILURE % escape(more))
+            break
+        part.write(text, html)
+    part.write("", _HTML_FAILURES_CLOSE)
+
+
+def render_digests(
     *,
     items: list[FeedItem],
     failures: list[str],
     now_utc: datetime,
     subject_prefix: str,
-) -> tuple[str, str, str]:
+    max_items: int | None = None,
+    max_items_per_domain: int | None = None,
+    max_bytes: int | None = None,
+) -> list[tuple[str, str, str]]:
+    # (subject, text body, html body) for each message of the digest. Items past the
+    # caps are summarised as "N more" lines; when max_bytes is set the digest is split
+    # into as many messages as needed, failures going at the end of the last one.
     by_domain: dict[str, list[FeedItem]] = defaultdict(list)
     for item in items:
         by_domain[item.feed_domain].append(item)
+    shown = _shown_items(
+        by_domain,
+        now_utc=now_utc,
+        max_items=max_items,
+        max_items_per_domain=max_items_per_domain,
+    )
 
     total = len(items)
     subject = f"{subject_prefix} ({total} new)"
+    # Room left for the header and footer, which are the same size in every part.
+    overhead = len(_HTML_HEAD % (subject, subject_prefix, "", ""))
+    budget = max_bytes - overhead - 200 if max_bytes else None
+
+    parts = [_Part(track_size=budget is not None)]
+    # Domains MAX_ITEMS left nothing of get no section, only the line after the others.
+    for domain in sorted(domain for domain in by_domain if shown[domain]):
+        part = parts[-1]
+        part.write(f"{domain}\n", _HTML_DOMAIN_OPEN % escape(domain))
+        for item in shown[domain]:
+            text, html = _item_fragments(item)
+            if (
+                budget is not None
+                and part.items
+                and part.size + _encoded_size(text, html) > budget
+            ):
+                part.write("\n", _HTML_DOMAIN_CLOSE)
+                part = _Part(track_size=True)
+                parts.append(part)
+                part.write(
+                    f"{domain} (continued)\n",
+                    _HTML_DOMAIN_OPEN % escape(f"{domain} (continued)"),
+                )
+            part.write(text, html)
+            part.items += 1
+        part.write("", _HTML_DOMAIN_CLOSE)
+        omitted = len(by_domain[domain]) - len(shown[domain])
+        if omitted:
+            more = f"… and {omitted} more from {domain}"
+            part.write(f"  {more}\n", _HTML_MORE % escape(more))
+        part.write("\n", "")
 
-    text_lines: list[str] = [f"{subject_prefix} - {total} new", ""]
-    html_parts: list[str] = [
-        "<!doctype html>",
-        "<html>",
-        "<head>",
-        '<meta charset="utf-8"/>',
-        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"/>",
-        "<title>" + escape(subject) + "</title>",
-        "</head>",
-        '<body style="font-family: -apple-system, Segoe UI, Roboto, Helvetica, Arial, sans-serif; line-height: 1.4;">',
-        f"<h1 style=\"margin:0 0 8px 0;\">{escape(subject_prefix)}</h1>",
-        f"<div style=\"color:#555; margin:0 0 16px 0;\">{escape(_fmt_dt(now_utc))} • {total} new</div>",
-    ]
-
-    for domain in sorted(by_domain.keys()):
-        domain_items = by_domain[domain]
-        text_lines.append(domain)
-        html_parts.append(f"<h2 style=\"margin:20px 0 8px 0;\">{escape(domain)}</h2>")
-        html_parts.append("<ol style=\"margin:0; padding-left: 22px;\">")
-        for item in domain_items:
-            title = item.entry_title or item.entry_link or item.entry_uid
-            link = item.entry_link or ""
-            published = _fmt_dt(item.published_utc)
-
-            text_lines.append(f"- {title}")
-            if link:
-                text_lines.append(f"  {link}")
-            if published:
-                text_lines.append(f"  {published}")
-
-            safe_title = escape(title)
-            safe_link = escape(link)
-            meta = " • ".join(x for x in [escape(item.feed_title or ""), escape(published)] if x)
-            meta_html = f'<div style="color:#666; font-size: 12px; margin-top: 2px;">{meta}</div>' if meta else ""
-            link_html = (
-                f'<a href="{safe_link}" style="color:#0b57d0; text-decoration:none;">{safe_title}</a>'
-                if link
-                else safe_title
-            )
-            html_parts.append(f"<li style=\"margin: 8px 0;\">{link_html}{meta_html}</li>")
-        html_parts.append("</ol>")
-        text_lines.append("")
+    dropped = [domain for domain in by_domain if not shown[domain]]
+    if dropped:
+        omitted = sum(len(by_domain[domain]) for domain in dropped)
+        sources = "source" if len(dropped) == 1 else "sources"
+        more = f"… and {omitted} more from {len(dropped)} other {sources}"
+        parts[-1].write(f"{more}\n\n", _HTML_MORE % escape(more))
 
     if failures:
-        text_lines.append("Failures:")
-        for failure in failures:
-            text_lines.append(f"- {failure}")
-
-        html_parts.append("<h2 style=\"margin:20px 0 8px 0;\">Failures</h2>")
-        html_parts.append("<ul style=\"margin:0; padding-left: 18px; color:#a00;\">")
-        for failure in failures:
-            html_parts.append(f"<li>{escape(failure)}</li>")
-        html_parts.append("</ul>")
-
-    html_parts.append("</body></html>")
-    text_body = "\n".join(text_lines).rstrip() + "\n"
-    html_body = "\n".join(html_parts) + "\n"
-    return subject, text_body, html_body
+        _write_failures(parts, failures, budget)
+
+    digests: list[tuple[str, str, str]] = []
+    count = len(parts)
+    for i, part in enumerate(parts, start=1):
+        suffix = f" [{i}/{count}]" if count > 1 else ""
+        heading = f"{total} new{f', part {i} of {count}' if count > 1 else ''}"
+        text_head = f"{subject_prefix} - {heading}\n\n"
+        html_head = _HTML_HEAD % (
+            escape(subject + suffix),
+            escape(subject_prefix),
+            escape(_fmt_dt(now_utc)),
+            escape(heading),
+        )
+        text_body = (text_head + part.text.getvalue()).rstrip() + "\n"
+        html_body = html_head + part.html.getvalue() + _HTML_TAIL
+        digests.append((subject + suffix, text_body, html_body))
+    return digests
+
+
+def render_email(
+    *,
+    items: list[FeedItem],
+    failures: list[str],
+    now_utc: datetime,
+    subject_prefix: str,
+) -> tuple[str, str, str]:
+    return render_digests(
+        items=items, failures=failures, now_utc=now_utc, subject_prefix=subject_prefix
+    )[0]
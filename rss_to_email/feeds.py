@@ -1,18 +1,70 @@
 from __future__ import annotations
 
+import functools
 import logging
-from dataclasses import dataclass
+import multiprocessing
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import asdict, dataclass, replace
 from datetime import datetime, timezone
+from typing import Any, Callable, Container, Iterable, Mapping, Sequence
 from urllib.parse import urlparse
 
 import feedparser
 import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
+from rss_to_email.checkpoint import Journal
 from rss_to_email.config import Config
-from rss_to_email.state import FeedState, State
+from rss_to_email.download import BoundedBody
+from rss_to_email.httpclient import (
+    FetchSession,
+    connection_stats,
+    create_session,
+    log_connection_reuse,
+    timing_connects,
+)
+from rss_to_email.metrics import FeedMetrics, RunMetrics
+from rss_to_email.parse_cache import ParseCache, body_digest
+from rss_to_email.parse_pool import Extracted, from_extracted, parse_extracted
+from rss_to_email.polling import (
+    failure_backoff,
+    header_min_interval,
+    in_backoff,
+    is_due,
+    next_poll,
+)
+from rss_to_email.state import (
+    FeedState,
+    HashedSeenUids,
+    SeenUids,
+    State,
+    canonical_feed_urls,
+    feed_state_from_raw,
+    feed_state_to_raw,
+    move_to_canonical,
+)
+from rss_to_email.stream_parse import StreamingParse
 from rss_to_email.util import coerce_uid, datetime_from_struct_time, safe_get
 
 
+_STREAM_CHUNK_SIZE = 64 * 1024
+_CACHE_HEADERS = ("Cache-Control", "Retry-After")
+_PERMANENT_REDIRECTS = frozenset({301, 308})
+
+# Called with each feed's fetch result as soon as it is in.
+OnResult = Callable[[str, "FetchResult | Exception"], None]
+
+
 @dataclass(frozen=True)
 class FeedItem:
     feed_url: str
@@ -24,11 +76,439 @@ class FeedItem:
     published_utc: datetime | None
 
 
-def _fetch_feed(*, url: str, config: Config) -> feedparser.FeedParserDict:
-    headers = {"User-Agent": config.user_agent}
-    resp = requests.get(url, headers=headers, timeout=config.http_timeout_seconds)
-    resp.raise_for_status()
-    return feedparser.parse(resp.content)
+def item_to_raw(item: FeedItem) -> dict[str, str | None]:
+    raw = asdict(item)
+    if item.published_utc is not None:
+        raw["published_utc"] = item.published_utc.isoformat()
+    return raw
+
+
+def item_from_raw(raw: Mapping[str, str | None]) -> FeedItem:
+    published = raw.get("published_utc")
+    return FeedItem(
+        feed_url=str(raw["feed_url"]),
+        feed_domain=str(raw["feed_domain"]),
+        feed_title=raw.get("feed_title"),
+        entry_uid=str(raw["entry_uid"]),
+        entry_title=raw.get("entry_title"),
+        entry_link=raw.get("entry_link"),
+        published_utc=datetime.fromisoformat(published) if published else None,
+    )
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    # parsed is None when the server answered 304 Not Modified, or sent the same body
+    # as last time, or while the body is still in the parse pool (pending_parse).
+    parsed: feedparser.FeedParserDict | None
+    etag: str | None
+    last_modified: str | None
+    cache_headers: dict[str, str]
+    content_digest: str | None = None
+    pending_parse: Future[Extracted] | None = None
+    # Where the leading permanent redirects of the request ended, if there were any.
+    permanent_url: str | None = None
+
+
+def permanent_redirect_url(hops: Sequence[tuple[int, str]]) -> str | None:
+    # hops is (status, url) for every response of a request, redirects first. Only an
+    # unbroken run of 301/308 from the start counts: http -> https (301) -> CDN (302)
+    # makes the https URL canonical, but not the CDN one.
+    url = None
+    for (status, _url), (_next_status, next_url) in zip(hops, hops[1:]):
+        if status not in _PERMANENT_REDIRECTS:
+            break
+        url = next_url
+    return url
+
+
+def conditional_headers(feed_state: FeedState | None) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    if feed_state is not None:
+        if feed_state.etag:
+            headers["If-None-Match"] = feed_state.etag
+        if feed_state.last_modified:
+            headers["If-Modified-Since"] = feed_state.last_modified
+    return headers
+
+
+def is_not_modified(status_code: int, feed_state: FeedState | None) -> bool:
+    return status_code == 304 and feed_state is not None
+
+
+def build_fetch_result(
+    *,
+    headers: Mapping[str, str],
+    parsed: feedparser.FeedParserDict | None,
+    feed_state: FeedState | None,
+    content_digest: str | None = None,
+    pending_parse: Future[Extracted] | None = None,
+    permanent_url: str | None = None,
+) -> FetchResult:
+    # parsed is None for a 304 or an unchanged body; headers must be case-insensitive.
+    cache_headers = {
+        name: headers[name] for name in _CACHE_HEADERS if headers.get(name) is not None
+    }
+    if parsed is None and pending_parse is None:
+        assert feed_state is not None
+        return FetchResult(
+            parsed=None,
+            etag=headers.get("ETag") or feed_state.etag,
+            last_modified=headers.get("Last-Modified") or feed_state.last_modified,
+            cache_headers=cache_headers,
+            content_digest=content_digest or feed_state.content_digest,
+            permanent_url=permanent_url,
+        )
+    return FetchResult(
+        parsed=parsed,
+        etag=headers.get("ETag"),
+        last_modified=headers.get("Last-Modified"),
+        cache_headers=cache_headers,
+        content_digest=content_digest,
+        pending_parse=pending_parse,
+        permanent_url=permanent_url,
+    )
+
+
+def parse_body(
+    body: bytes,
+    *,
+    feed_state: FeedState | None,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    record: FeedMetrics,
+    abandoned: threading.Event | None = None,
+) -> tuple[feedparser.FeedParserDict | None, str, Future[Extracted] | None]:
+    # Returns None for the parse when the body is byte-identical to the one this feed
+    # served last time: everything in it was already deduped against, so there is
+    # nothing to parse. Servers that ignore conditional GET hit this on every poll.
+    # With a parse pool the body is submitted and the future returned instead.
+    with record.parsing():
+        digest = body_digest(body)
+        if feed_state is not None and feed_state.content_digest == digest:
+            record.parse_cache = "unchanged"
+            return None, digest, None
+        parsed = parse_cache.get(digest) if parse_cache is not None else None
+        if parsed is not None:
+            record.parse_cache = "hit"
+            return parsed, digest, None
+        if parse_pool is not None:
+            return None, digest, parse_pool.submit(parse_extracted, body)
+        parsed = feedparser.parse(body)
+    if parse_cache is not None and (abandoned is None or not abandoned.is_set()):
+        parse_cache.put(digest, parsed)
+    return parsed, digest, None
+
+
+def streaming_parse(
+    *, feed_state: FeedState | None, seen: Container[str] | None, config: Config
+) -> StreamingParse:
+    # seen, when given, replaces the feed's own history as what counts as old news.
+    if seen is None:
+        seen = feed_state.seen_uids if feed_state is not None else ()
+    return StreamingParse(
+        seen=seen,
+        max_items=config.max_items_per_feed,
+        stop_after_seen=config.stop_after_seen,
+    )
+
+
+class FetchDeadlineExceeded(TimeoutError):
+    pass
+
+
+class HostUnavailable(Exception):
+    pass
+
+
+def deadline_exceeded(config: Config) -> FetchDeadlineExceeded:
+    return FetchDeadlineExceeded(f"fetch deadline of {config.fetch_deadline_seconds}s exceeded")
+
+
+def failure_response(exc: Exception) -> tuple[int, str, Mapping[str, str]] | None:
+    # (status, reason, headers) of the response behind an HTTP error, for both
+    # requests.HTTPError and aiohttp.ClientResponseError.
+    response = getattr(exc, "response", None)
+    if isinstance(exc, requests.HTTPError) and response is not None:
+        return response.status_code, response.reason or "", response.headers
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status, str(getattr(exc, "message", "") or ""), getattr(exc, "headers", None) or {}
+    return None
+
+
+def is_host_failure(exc: Exception) -> bool:
+    # Failures that say the server, not this one feed, is in trouble.
+    response = failure_response(exc)
+    if response is not None:
+        return response[0] == 429 or response[0] >= 500
+    if isinstance(exc, ValueError):
+        # requests' InvalidURL and friends.
+        return False
+    return isinstance(exc, (OSError, TimeoutError))
+
+
+class HostBreaker:
+    # Counts consecutive host-level failures per host within a run. Once a host reaches
+    # the threshold its remaining feeds are not requested this run, so a dead or
+    # overloaded server stops tying up workers and the fetch deadline.
+
+    def __init__(self, threshold: int) -> None:
+        self._threshold = threshold
+        self._failures: Counter[str] = Counter()
+
+    def record(self, host: str, *, failed: bool) -> None:
+        if failed:
+            self._failures[host] += 1
+        else:
+            self._failures[host] = 0
+
+    def is_open(self, host: str) -> bool:
+        return self._threshold > 0 and self._failures[host] >= self._threshold
+
+    def error(self, host: str) -> HostUnavailable:
+        return HostUnavailable(
+            f"not fetched: {host} failed {self._failures[host]} times in a row this run"
+        )
+
+
+def bounded_body(headers: Mapping[str, str], config: Config) -> BoundedBody:
+    return BoundedBody(
+        content_encoding=headers.get("Content-Encoding"),
+        content_length=headers.get("Content-Length"),
+        max_bytes=config.max_feed_bytes,
+        read_deadline_seconds=config.feed_read_deadline_seconds,
+    )
+
+
+def _iter_raw(resp: requests.Response) -> Iterable[bytes]:
+    # iter_content() without urllib3 decoding the body (BoundedBody does that), with
+    # the same mapping to requests' exceptions. read1() returns whatever one recv
+    # brings instead of waiting for a full chunk, so BoundedBody sees a trickled body
+    # often enough to enforce its read deadline.
+    try:
+        while raw := resp.raw.read1(_STREAM_CHUNK_SIZE, decode_content=False):
+            yield raw
+    except ProtocolError as exc:
+        raise requests.exceptions.ChunkedEncodingError(exc) from exc
+    except ReadTimeoutError as exc:
+        raise requests.exceptions.ConnectionError(exc) from exc
+
+
+def _fetch_feed(
+    *,
+    session: requests.Session,
+    url: str,
+    feed_state: FeedState | None,
+    seen: Container[str] | None,
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    abandoned: threading.Event,
+) -> FetchResult:
+    # Bodies are always streamed, so an oversized one fails at MAX_FEED_BYTES instead
+    # of being buffered whole. Once the run has given up on this fetch (abandoned),
+    # it may still finish, but leaves no trace in metrics or the parse cache.
+    with metrics.feed(url, abandoned=abandoned) as record, timing_connects(record), session.get(
+        url,
+        headers=conditional_headers(feed_state),
+        timeout=config.http_timeout_seconds,
+        stream=True,
+    ) as resp:
+        record.status = resp.status_code
+        moved = permanent_redirect_url(
+            [(hop.status_code, hop.url) for hop in (*resp.history, resp)]
+        )
+        if is_not_modified(resp.status_code, feed_state):
+            # Reading the (empty) body lets the connection go back to the pool.
+            resp.content
+            return build_fetch_result(
+                headers=resp.headers, parsed=None, feed_state=feed_state, permanent_url=moved
+            )
+        resp.raise_for_status()
+        body = bounded_body(resp.headers, config)
+        digest = pending = None
+        if config.parse_mode == "incremental":
+            # Leaving the with-block early drops the rest of the body unread.
+            stream = streaming_parse(feed_state=feed_state, seen=seen, config=config)
+            for raw in _iter_raw(resp):
+                chunk = body.decode(raw)
+                record.bytes = body.size
+                with record.parsing():
+                    if stream.push(chunk):
+                        break
+            else:
+                stream.push(body.flush())
+            with record.parsing():
+                parsed = stream.finish()
+        else:
+            chunks = [body.decode(raw) for raw in _iter_raw(resp)]
+            chunks.append(body.flush())
+            record.bytes = body.size
+            parsed, digest, pending = parse_body(
+                b"".join(chunks),
+                feed_state=feed_state,
+                parse_cache=parse_cache,
+                parse_pool=parse_pool,
+                record=record,
+                abandoned=abandoned,
+            )
+    return build_fetch_result(
+        headers=resp.headers,
+        parsed=parsed,
+        feed_state=feed_state,
+        content_digest=digest,
+        pending_parse=pending,
+        permanent_url=moved,
+    )
+
+
+def feed_host(url: str) -> str:
+    return urlparse(url).netloc or url
+
+
+class _DaemonThreadPool(Executor):
+    # A ThreadPoolExecutor whose workers are daemon threads. ThreadPoolExecutor joins
+    # its workers at interpreter exit, so a request abandoned at the fetch deadline
+    # would keep the process alive until its own timeouts ran out.
+
+    def __init__(self, *, max_workers: int, thread_name_prefix: str) -> None:
+        self._work: queue.SimpleQueue[tuple[Future, Callable[[], Any]] | None] = (
+            queue.SimpleQueue()
+        )
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{thread_name_prefix}_{n}", daemon=True)
+            for n in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        self._work.put((future, functools.partial(fn, *args, **kwargs)))
+        return future
+
+    def _worker(self) -> None:
+        while (work := self._work.get()) is not None:
+            future, call = work
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = call()
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            while True:
+                try:
+                    work = self._work.get_nowait()
+                except queue.Empty:
+                    break
+                if work is not None:
+                    work[0].cancel()
+        for _ in self._threads:
+            self._work.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def _fetch_all(
+    *,
+    session: requests.Session,
+    feed_urls: list[str],
+    feeds: dict[str, FeedState],
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    abandoned: threading.Event,
+    on_result: OnResult | None = None,
+    seen_by: Mapping[str, Container[str]] | None = None,
+) -> dict[str, FetchResult | Exception]:
+    # Hosts are served round-robin so one host with many feeds can't hold every worker;
+    # each host is capped at fetch_per_host_limit in-flight requests.
+    queues: dict[str, deque[str]] = {}
+    for url in dict.fromkeys(feed_urls):
+        queues.setdefault(feed_host(url), deque()).append(url)
+
+    deadline = (
+        time.monotonic() + config.fetch_deadline_seconds
+        if config.fetch_deadline_seconds is not None
+        else None
+    )
+    results: dict[str, FetchResult | Exception] = {}
+    in_flight: dict[Future, str] = {}
+    host_in_flight: Counter[str] = Counter()
+    ready_hosts = deque(queues)
+    breaker = HostBreaker(config.host_failure_threshold)
+
+    executor = _DaemonThreadPool(max_workers=config.fetch_workers, thread_name_prefix="fetch")
+    try:
+        while ready_hosts or in_flight:
+            blocked: list[str] = []
+            while ready_hosts and len(in_flight) < config.fetch_workers:
+                host = ready_hosts.popleft()
+                if breaker.is_open(host):
+                    while queues[host]:
+                        results[queues[host].popleft()] = breaker.error(host)
+                    continue
+                if host_in_flight[host] >= config.fetch_per_host_limit:
+                    blocked.append(host)
+                    continue
+                url = queues[host].popleft()
+                future = executor.submit(
+                    _fetch_feed,
+                    session=session,
+                    url=url,
+                    feed_state=feeds.get(url),
+                    seen=seen_by.get(url) if seen_by is not None else None,
+                    config=config,
+                    metrics=metrics,
+                    parse_cache=parse_cache,
+                    parse_pool=parse_pool,
+                    abandoned=abandoned,
+                )
+                in_flight[future] = url
+                host_in_flight[host] += 1
+                if queues[host]:
+                    ready_hosts.append(host)
+            ready_hosts.extendleft(reversed(blocked))
+
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _pending = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                url = in_flight.pop(future)
+                host_in_flight[feed_host(url)] -= 1
+                exc = future.exception()
+                breaker.record(
+                    feed_host(url), failed=isinstance(exc, Exception) and is_host_failure(exc)
+                )
+                results[url] = exc if exc is not None else future.result()
+                if on_result is not None:
+                    on_result(url, results[url])
+    finally:
+        # Requests still running are left to finish (or time out) on their own.
+        if in_flight:
+            abandoned.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    unfinished = list(in_flight.values()) + [u for h in ready_hosts for u in queues[h]]
+    if unfinished:
+        logging.warning(
+            "Fetch deadline of %.1fs exceeded; %d feeds unfinished.",
+            config.fetch_deadline_seconds,
+            len(unfinished),
+        )
+        for url in unfinished:
+            results[url] = deadline_exceeded(config)
+    return results
 
 
 def _format_failure(*, url: str, exc: Exception, user_agent: str) -> str:
@@ -37,9 +517,10 @@ def _format_failure(*, url: str, exc: Exception, user_agent: str) -> str:
     if message:
         details.append(message)
 
-    if isinstance(exc, requests.HTTPError) and exc.response is not None:
-        response = exc.response
-        status = f"{response.status_code} {response.reason}".strip()
+    response = failure_response(exc)
+    if response is not None:
+        status_code, reason, response_headers = response
+        status = f"{status_code} {reason}".strip()
         if status:
             details.append(f"status={status}")
         header_keys = {
@@ -51,7 +532,7 @@ def _format_failure(*, url: str, exc: Exception, user_agent: str) -> str:
         }
         headers = {
             key: value
-            for key, value in response.headers.items()
+            for key, value in response_headers.items()
             if key.lower() in header_keys
         }
         if headers:
@@ -68,88 +549,667 @@ def _format_failure(*, url: str, exc: Exception, user_agent: str) -> str:
     return f"{url} ({'; '.join(details)})"
 
 
+def _fetch_stage(
+    *,
+    due_urls: list[str],
+    feeds: Mapping[str, FeedState],
+    config: Config,
+    session: FetchSession | None,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    on_result: OnResult | None = None,
+    seen_by: Mapping[str, Container[str]] | None = None,
+) -> dict[str, FetchResult | Exception]:
+    # A session kept for the other engine (FETCH_ENGINE changed under a daemon) is left
+    # alone; the run opens its own.
+    if config.fetch_engine == "asyncio":
+        from rss_to_email.async_fetch import AsyncSession, fetch_all_async
+
+        fetch_all = session.fetch_all if isinstance(session, AsyncSession) else fetch_all_async
+        return fetch_all(
+            feed_urls=due_urls,
+            feeds=feeds,
+            config=config,
+            metrics=metrics,
+            parse_cache=parse_cache,
+            parse_pool=parse_pool,
+            on_result=on_result,
+            seen_by=seen_by,
+        )
+
+    own_session = not isinstance(session, requests.Session)
+    if not isinstance(session, requests.Session):
+        session = create_session(config)
+    abandoned = threading.Event()
+    try:
+        stats_before = connection_stats(session)
+        fetched = _fetch_all(
+            session=session,
+            feed_urls=due_urls,
+            feeds=feeds,
+            config=config,
+            metrics=metrics,
+            parse_cache=parse_cache,
+            parse_pool=parse_pool,
+            abandoned=abandoned,
+            on_result=on_result,
+            seen_by=seen_by,
+        )
+        log_connection_reuse(before=stats_before, after=connection_stats(session))
+    finally:
+        # Not closed under requests given up on at the deadline: they finish on it, and
+        # its connections are closed once the last of them lets go of it.
+        if own_session and not abandoned.is_set():
+            session.close()
+    return fetched
+
+
+def _finish_parse(
+    *,
+    url: str,
+    result: FetchResult,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+) -> FetchResult | Exception:
+    assert result.pending_parse is not None
+    try:
+        feed, entries, seconds = result.pending_parse.result()
+    except Exception as exc:
+        return exc
+    metrics.add_parse_seconds(url, seconds)
+    parsed = from_extracted(feed, entries)
+    if parse_cache is not None and result.content_digest is not None:
+        parse_cache.put(result.content_digest, parsed)
+    return replace(result, parsed=parsed, pending_parse=None)
+
+
+def _parse_pool(config: Config) -> ProcessPoolExecutor | None:
+    # Workers come from a forkserver: the pool starts them lazily, from whichever fetch
+    # thread submits first, and forking a process with other threads running can copy
+    # a lock some other thread was holding.
+    if config.parse_workers > 0 and config.parse_mode == "full":
+        return ProcessPoolExecutor(
+            max_workers=config.parse_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return None
+
+
+def _fetch_due(
+    *,
+    feed_urls: list[str],
+    feeds: Mapping[str, FeedState],
+    run_started_at: datetime,
+    config: Config,
+    session: FetchSession | None,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+    parse_pool: Executor | None,
+    on_result: OnResult | None = None,
+    seen_by: Mapping[str, Container[str]] | None = None,
+) -> dict[str, FetchResult | Exception]:
+    due_urls = feed_urls
+    if config.adaptive_polling:
+        due_urls = [url for url in feed_urls if is_due(feeds.get(url), run_started_at)]
+        logging.info(
+            "Adaptive polling: %d of %d feeds due.",
+            len(set(due_urls)),
+            len(set(feed_urls)),
+        )
+    backing_off = {url for url in due_urls if in_backoff(feeds.get(url), run_started_at)}
+    if backing_off:
+        logging.info("Skipping %d failing feeds until their retry time.", len(backing_off))
+        due_urls = [url for url in due_urls if url not in backing_off]
+    return _fetch_stage(
+        due_urls=due_urls,
+        feeds=feeds,
+        config=config,
+        session=session,
+        metrics=metrics,
+        parse_cache=parse_cache,
+        parse_pool=parse_pool,
+        on_result=on_result,
+        seen_by=seen_by,
+    )
+
+
 def fetch_new_items(
     *,
     feed_urls: list[str],
     prior_state: State,
     run_started_at: datetime,
     config: Config,
+    session: FetchSession | None = None,
+    metrics: RunMetrics | None = None,
+    parse_cache: ParseCache | None = None,
+    journal: Journal | None = None,
+) -> tuple[list[FeedItem], list[str], State]:
+    # Fetch (thread pool or event loop) -> parse (in the fetch worker, or a process
+    # pool when PARSE_WORKERS > 0) -> dedupe (here, as each feed comes in). With a parse
+    # pool, fetch workers hand the body off and move on to the next download. With a
+    # journal, feeds a killed run already finished are taken from it, not fetched.
+    if metrics is None:
+        metrics = RunMetrics()
+
+    feed_urls = canonical_feed_urls(feed_urls, prior_state.feeds)
+    dedupe = _RunDedupe(
+        prior_state=prior_state,
+        run_started_at=run_started_at,
+        config=config,
+        metrics=metrics,
+        parse_cache=parse_cache,
+        journal=journal,
+    )
+    parse_pool = _parse_pool(config)
+    try:
+        fetched = _fetch_due(
+            feed_urls=[url for url in feed_urls if url not in dedupe.outcomes],
+            feeds=prior_state.feeds,
+            run_started_at=run_started_at,
+            config=config,
+            session=session,
+            metrics=metrics,
+            parse_cache=parse_cache,
+            parse_pool=parse_pool,
+            on_result=dedupe.add,
+        )
+        return dedupe.finish(feed_urls=feed_urls, fetched=fetched)
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
+
+
+class _SeenByAll:
+    # Membership in every subscriber's history, for the incremental parser's early stop:
+    # reading may only stop once entries are old news to everyone. Passed to the fetch
+    # as seen_by, next to the shared FeedState rather than as its seen_uids.
+    __slots__ = ("_histories",)
+
+    def __init__(self, histories: Iterable[SeenUids | HashedSeenUids]) -> None:
+        self._histories = list(histories)
+
+    def __contains__(self, uid: object) -> bool:
+        return all(uid in seen for seen in self._histories)
+
+
+def shared_feed_state(states: Sequence[FeedState | None]) -> FeedState | None:
+    # What a single fetch on behalf of several subscribers may assume. A 304 or an
+    # unchanged body only means "nothing new" if each of them last read the same
+    # version, so validators and the body digest are kept only when they all agree.
+    # After one shared fetch they do, since every subscriber stores the same response.
+    # The history is left empty: dedupe reads each subscriber's own.
+    if len(states) == 1:
+        return states[0]
+    known = [feed_state for feed_state in states if feed_state is not None]
+    if not known or len(known) < len(states):
+        return None
+    first = known[0]
+    agree = all(
+        (s.etag, s.last_modified, s.content_digest)
+        == (first.etag, first.last_modified, first.content_digest)
+        for s in known
+    )
+    next_polls = [s.next_poll_utc for s in known]
+    retry_ats = [s.retry_at_utc for s in known]
+    return FeedState(
+        etag=first.etag if agree else None,
+        last_modified=first.last_modified if agree else None,
+        content_digest=first.content_digest if agree else None,
+        # Due as soon as it is due for any subscriber.
+        next_poll_utc=None if None in next_polls else min(next_polls),
+        retry_at_utc=None if None in retry_ats else min(retry_ats),
+    )
+
+
+def fetch_new_items_shared(
+    *,
+    subscriptions: Sequence[tuple[Config, State]],
+    run_started_at: datetime,
+    config: Config,
+    session: FetchSession | None = None,
+    metrics: RunMetrics | None = None,
+    parse_cache: ParseCache | None = None,
+) -> list[tuple[list[FeedItem], list[str], State]]:
+    # fetch_new_items for several (feed list, state) pairs at once. Each distinct URL is
+    # fetched and parsed once, using config's fetch settings; the result is then deduped
+    # separately against every subscriber's state, in the same order as subscriptions.
+    if metrics is None:
+        metrics = RunMetrics()
+
+    # Each subscriber's list is resolved against its own recorded redirects.
+    sub_feed_urls = [
+        canonical_feed_urls(sub_config.feed_urls, sub_state.feeds)
+        for sub_config, sub_state in subscriptions
+    ]
+    subscribers: dict[str, list[FeedState | None]] = {}
+    for urls, (_sub_config, sub_state) in zip(sub_feed_urls, subscriptions):
+        for url in urls:
+            subscribers.setdefault(url, []).append(sub_state.feeds.get(url))
+    feeds = {
+        url: feed_state
+        for url, states in subscribers.items()
+        if (feed_state := shared_feed_state(states)) is not None
+    }
+    seen_by = {
+        url: _SeenByAll(feed_state.seen_uids for feed_state in states if feed_state is not None)
+        for url, states in subscribers.items()
+        if len(states) > 1 and url in feeds
+    }
+    logging.info(
+        "Fetching %d unique feeds for %d subscriptions.",
+        len(subscribers),
+        sum(len(states) for states in subscribers.values()),
+    )
+
+    parse_pool = _parse_pool(config)
+    try:
+        fetched = _fetch_due(
+            feed_urls=list(subscribers),
+            feeds=feeds,
+            run_started_at=run_started_at,
+            config=config,
+            session=session,
+            metrics=metrics,
+            parse_cache=parse_cache,
+            parse_pool=parse_pool,
+            seen_by=seen_by,
+        )
+        # Collected here, once, rather than by the first subscriber's dedupe.
+        for url, result in fetched.items():
+            if isinstance(result, FetchResult) and result.pending_parse is not None:
+                fetched[url] = _finish_parse(
+                    url=url, result=result, metrics=metrics, parse_cache=parse_cache
+                )
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
+
+    return [
+        _dedupe_stage(
+            feed_urls=urls,
+            fetched=fetched,
+            prior_state=sub_state,
+            run_started_at=run_started_at,
+            config=sub_config,
+            metrics=metrics,
+            parse_cache=parse_cache,
+        )
+        for urls, (sub_config, sub_state) in zip(sub_feed_urls, subscriptions)
+    ]
+
+
+@dataclass
+class FeedOutcome:
+    # What one feed contributed to a run: its new items or its failure, and the UIDs
+    # added to its history. Everything else it changed is in the run's next_state.
+    items: list[FeedItem]
+    failure: str | None
+    seen_added: list[str]
+
+
+def seen_limit(seen_uids: SeenUids | HashedSeenUids, config: Config) -> int:
+    if isinstance(seen_uids, HashedSeenUids):
+        return config.seen_hashes_per_feed_limit
+    return config.seen_uids_per_feed_limit
+
+
+def _sort_items(items: list[FeedItem], run_started_at: datetime) -> None:
+    items.sort(key=lambda item: (item.feed_domain, item.published_utc or run_started_at))
+
+
+def _dedupe_stage(
+    *,
+    feed_urls: list[str],
+    fetched: Mapping[str, FetchResult | Exception],
+    prior_state: State,
+    run_started_at: datetime,
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
 ) -> tuple[list[FeedItem], list[str], State]:
     new_items: list[FeedItem] = []
     failures: list[str] = []
-
     next_state = prior_state.copy()
-    last_run = prior_state.last_run_utc
-    warm_start = last_run is None and not config.initial_run_send
 
     for feed_url in feed_urls:
-        parsed_domain = urlparse(feed_url).netloc or feed_url
-        feed_state = next_state.feeds.get(feed_url) or FeedState(seen_uids=[])
-        seen = set(feed_state.seen_uids)
-
-        try:
-            parsed = _fetch_feed(url=feed_url, config=config)
-        except Exception as exc:
-            failure = _format_failure(url=feed_url, exc=exc, user_agent=config.user_agent)
-            failures.append(failure)
-            logging.warning("Failed to fetch %s: %s", feed_url, failure)
-            next_state.feeds[feed_url] = feed_state
+        result = fetched.get(feed_url)
+        if result is None:
             continue
+        outcome = _dedupe_feed(
+            feed_url=feed_url,
+            result=result,
+            next_state=next_state,
+            last_run=prior_state.last_run_utc,
+            run_started_at=run_started_at,
+            config=config,
+            metrics=metrics,
+            parse_cache=parse_cache,
+        )
+        new_items.extend(outcome.items)
+        if outcome.failure is not None:
+            failures.append(outcome.failure)
 
-        feed_title = safe_get(parsed, "feed", "title")
-        entries = list(parsed.entries or [])
-        if config.max_items_per_feed is not None:
-            entries = entries[: config.max_items_per_feed]
+    _sort_items(new_items, run_started_at)
+    return new_items, failures, next_state
 
-        uids_to_mark_seen: list[tuple[datetime | None, str]] = []
 
-        for entry in entries:
-            entry_uid = coerce_uid(entry)
-            if not entry_uid:
-                continue
-            if entry_uid in seen:
+def _journal_entry(
+    feed_url: str, moved_to: str | None, outcome: FeedOutcome, feed_state: FeedState | None
+) -> dict[str, Any]:
+    # The feed's history is journaled as the UIDs added, not the whole (long) list.
+    return {
+        "url": feed_url,
+        "moved_to": moved_to,
+        "feed": (
+            feed_state_to_raw(replace(feed_state, seen_uids=SeenUids()))
+            if feed_state is not None
+            else None
+        ),
+        "seen_added": outcome.seen_added,
+        "items": [item_to_raw(item) for item in outcome.items],
+        "failure": outcome.failure,
+    }
+
+
+def _replay(entry: Mapping[str, Any], next_state: State, config: Config) -> FeedOutcome:
+    # Re-applies a journaled feed to a state the journal was started from.
+    feed_url = entry["url"]
+    if entry.get("moved_to"):
+        move_to_canonical(next_state.feeds, feed_url, entry["moved_to"])
+        feed_url = entry["moved_to"]
+    if entry.get("feed") is not None:
+        seen = next_state.feeds.edit(feed_url).seen_uids
+        if (
+            config.seen_uids_mode == "hashed"
+            and isinstance(seen, SeenUids)
+            and entry.get("failure") is None
+        ):
+            seen = HashedSeenUids.from_uids(seen)
+        seen.add_many(entry["seen_added"], limit=seen_limit(seen, config))
+        next_state.feeds[feed_url] = replace(feed_state_from_raw(entry["feed"]), seen_uids=seen)
+    return FeedOutcome(
+        items=[item_from_raw(item) for item in entry["items"]],
+        failure=entry.get("failure"),
+        seen_added=entry["seen_added"],
+    )
+
+
+class _RunDedupe:
+    # Dedupes each feed as soon as its fetch completes rather than after the whole
+    # pass, journaling the outcome when there is a journal. Callbacks come from the
+    # thread that drives the fetch, so nothing here is shared with fetch workers: they
+    # only read prior_state, while edits go to next_state's overlay.
+
+    def __init__(
+        self,
+        *,
+        prior_state: State,
+        run_started_at: datetime,
+        config: Config,
+        metrics: RunMetrics,
+        parse_cache: ParseCache | None,
+        journal: Journal | None,
+    ) -> None:
+        self.next_state = prior_state.copy()
+        self.outcomes: dict[str, FeedOutcome] = {}
+        self._last_run = prior_state.last_run_utc
+        self._run_started_at = run_started_at
+        self._config = config
+        self._metrics = metrics
+        self._parse_cache = parse_cache
+        self._journal = journal
+        # Bodies still in the parse pool, picked up once they are done.
+        self._parsing: dict[str, FetchResult] = {}
+        if journal is None:
+            return
+
+        delivered, pending = journal.resume(
+            started_from=self._last_run.isoformat() if self._last_run is not None else None
+        )
+        for entry in delivered:
+            # Already mailed; only the state changes were lost.
+            outcome = _replay(entry, self.next_state, config)
+            self.outcomes[entry["url"]] = replace(outcome, items=[], failure=None)
+        for entry in pending:
+            self.outcomes[entry["url"]] = _replay(entry, self.next_state, config)
+        if self.outcomes:
+            logging.info(
+                "Resuming from %s: %d feeds already done (%d already mailed).",
+                journal.path,
+                len(self.outcomes),
+                len(delivered),
+            )
+
+    def add(self, url: str, result: FetchResult | Exception) -> None:
+        if url in self.outcomes or url in self._parsing:
+            return
+        if (
+            isinstance(result, FetchResult)
+            and result.pending_parse is not None
+            and not result.pending_parse.done()
+        ):
+            self._parsing[url] = result
+        else:
+            self._dedupe(url, result)
+        for parsing_url, parsing in list(self._parsing.items()):
+            assert parsing.pending_parse is not None
+            if parsing.pending_parse.done():
+                del self._parsing[parsing_url]
+                self._dedupe(parsing_url, parsing)
+
+    def _dedupe(self, url: str, result: FetchResult | Exception) -> None:
+        outcome = _dedupe_feed(
+            feed_url=url,
+            result=result,
+            next_state=self.next_state,
+            last_run=self._last_run,
+            run_started_at=self._run_started_at,
+            config=self._config,
+            metrics=self._metrics,
+            parse_cache=self._parse_cache,
+        )
+        self.outcomes[url] = outcome
+        # A feed cut off by the fetch deadline is tried again by a resumed run.
+        if self._journal is not None and not isinstance(result, FetchDeadlineExceeded):
+            moved_to = None
+            if isinstance(result, FetchResult) and result.permanent_url not in (None, url):
+                moved_to = result.permanent_url
+            self._journal.record(
+                _journal_entry(url, moved_to, outcome, self.next_state.feeds.get(moved_to or url))
+            )
+
+    def finish(
+        self, *, feed_urls: list[str], fetched: Mapping[str, FetchResult | Exception]
+    ) -> tuple[list[FeedItem], list[str], State]:
+        for url, result in fetched.items():
+            self.add(url, result)
+        for url, result in list(self._parsing.items()):
+            del self._parsing[url]
+            self._dedupe(url, result)
+
+        new_items: list[FeedItem] = []
+        failures: list[str] = []
+        for url in dict.fromkeys(feed_urls):
+            outcome = self.outcomes.get(url)
+            if outcome is None:
                 continue
+            new_items.extend(outcome.items)
+            if outcome.failure is not None:
+                failures.append(outcome.failure)
+        _sort_items(new_items, self._run_started_at)
+        return new_items, failures, self.next_state
+
 
-            published = datetime_from_struct_time(
-                entry.get("published_parsed") or entry.get("updated_parsed")
+def _dedupe_feed(
+    *,
+    feed_url: str,
+    result: FetchResult | Exception,
+    next_state: State,
+    last_run: datetime | None,
+    run_started_at: datetime,
+    config: Config,
+    metrics: RunMetrics,
+    parse_cache: ParseCache | None,
+) -> FeedOutcome:
+    parsed_domain = feed_host(feed_url)
+    feed_state = next_state.feeds.get(feed_url)
+    seen = feed_state.seen_uids if feed_state is not None else SeenUids()
+    warm_start = last_run is None and not config.initial_run_send
+    new_items: list[FeedItem] = []
+
+    if isinstance(result, FetchResult) and result.pending_parse is not None:
+        result = _finish_parse(
+            url=feed_url, result=result, metrics=metrics, parse_cache=parse_cache
+        )
+    if isinstance(result, Exception):
+        metrics.record_failure(feed_url, result)
+        failure = _format_failure(url=feed_url, exc=result, user_agent=config.user_agent)
+        logging.warning("Failed to fetch %s: %s", feed_url, failure)
+        # Running out of time says nothing about the feed itself.
+        if not isinstance(result, FetchDeadlineExceeded):
+            feed_state = next_state.feeds.edit(feed_url)
+            if (
+                feed_state.high_water_utc is None
+                and feed_state.last_success_utc is None
+                and last_run is not None
+            ):
+                # Never read, so nothing but last_run cuts this feed off, and last_run
+                # moves on while it backs off. Holding its own mark at this run's
+                # cutoff keeps what it publishes during the outage.
+                feed_state.high_water_utc = last_run
+            feed_state.failure_count += 1
+            response = failure_response(result)
+            feed_state.retry_at_utc = failure_backoff(
+                failure_count=feed_state.failure_count,
+                headers=response[2] if response is not None else None,
+                now=run_started_at,
+                config=config,
             )
-            if published is not None:
-                published = published.astimezone(timezone.utc)
+        return FeedOutcome(items=[], failure=failure, seen_added=[])
 
-            if not warm_start:
-                if last_run is not None and published is not None and published <= last_run:
-                    continue
+    if result.permanent_url is not None and result.permanent_url != feed_url:
+        # Deduped, and from now on fetched, under the URL it redirected to.
+        move_to_canonical(next_state.feeds, feed_url, result.permanent_url)
+        feed_url = result.permanent_url
+        parsed_domain = feed_host(feed_url)
+        feed_state = next_state.feeds.get(feed_url)
+        seen = feed_state.seen_uids if feed_state is not None else SeenUids()
+
+    # Each feed is cut off at its own high-water mark, the newest entry it has
+    # served, so its progress doesn't depend on how other feeds are doing. Feeds
+    # without one yet fall back to last_run; one that was skipped or failing while
+    # last_run moved on must still see everything since it was last read.
+    high_water_uid = None
+    if feed_state is not None and feed_state.high_water_utc is not None:
+        cutoff = feed_state.high_water_utc
+        high_water_uid = feed_state.high_water_uid
+    else:
+        cutoff = last_run
+        if cutoff is not None and feed_state is not None and feed_state.last_success_utc:
+            cutoff = min(cutoff, feed_state.last_success_utc)
+
+    prior_feed_state = feed_state
+    feed_state = next_state.feeds.edit(feed_url)
+    feed_state.etag = result.etag
+    feed_state.last_modified = result.last_modified
+    feed_state.content_digest = result.content_digest
+    feed_state.last_success_utc = run_started_at
+    feed_state.failure_count = 0
+    feed_state.retry_at_utc = None
+    if config.seen_uids_mode == "hashed" and isinstance(feed_state.seen_uids, SeenUids):
+        feed_state.seen_uids = HashedSeenUids.from_uids(feed_state.seen_uids)
+
+    parsed = result.parsed
+    entries = list(parsed.entries or []) if parsed is not None else []
+    if config.max_items_per_feed is not None:
+        entries = entries[: config.max_items_per_feed]
 
-                new_items.append(
-                    FeedItem(
-                        feed_url=feed_url,
-                        feed_domain=parsed_domain,
-                        feed_title=feed_title,
-                        entry_uid=entry_uid,
-                        entry_title=safe_get(entry, "title"),
-                        entry_link=safe_get(entry, "link"),
-                        published_utc=published,
-                    )
+    if config.adaptive_polling:
+        feed_state.next_poll_utc, feed_state.poll_interval_seconds = next_poll(
+            feed_state=prior_feed_state,
+            parsed=parsed,
+            entries=entries,
+            header_interval=header_min_interval(result.cache_headers, run_started_at),
+            now=run_started_at,
+            config=config,
+        )
+
+    if parsed is None:
+        logging.debug("Not modified (304 or unchanged body): %s", feed_url)
+        return FeedOutcome(items=[], failure=None, seen_added=[])
+
+    feed_title = safe_get(parsed, "feed", "title")
+
+    uids_to_mark_seen: list[tuple[datetime | None, str]] = []
+    newest: tuple[datetime, str] | None = None
+    previous: datetime | None = None
+    newest_first = True
+
+    for entry in entries:
+        entry_uid = coerce_uid(entry)
+        if not entry_uid:
+            continue
+
+        published = datetime_from_struct_time(
+            entry.get("published_parsed") or entry.get("updated_parsed")
+        )
+        if published is not None:
+            published = published.astimezone(timezone.utc)
+            if newest is None or published > newest[0]:
+                newest = (published, entry_uid)
+        if published is None or (previous is not None and published > previous):
+            newest_first = False
+        previous = published
+
+        if (
+            entry_uid == high_water_uid
+            and newest_first
+            and published is not None
+            and cutoff is not None
+            and published <= cutoff
+        ):
+            # A newest-first feed is back at the entry that set the mark; everything
+            # after it is older still and would be cut off anyway.
+            break
+        if entry_uid in seen:
+            continue
+
+        if not warm_start:
+            if cutoff is not None and published is not None and published <= cutoff:
+                continue
+
+            new_items.append(
+                FeedItem(
+                    feed_url=feed_url,
+                    feed_domain=parsed_domain,
+                    feed_title=feed_title,
+                    entry_uid=entry_uid,
+                    entry_title=safe_get(entry, "title"),
+                    entry_link=safe_get(entry, "link"),
+                    published_utc=published,
                 )
+            )
 
-            uids_to_mark_seen.append((published, entry_uid))
+        uids_to_mark_seen.append((published, entry_uid))
 
-        if warm_start:
-            uids_to_mark_seen = []
-            for entry in reversed(entries):
-                entry_uid = coerce_uid(entry)
-                if entry_uid:
-                    uids_to_mark_seen.append((None, entry_uid))
+    if newest is not None:
+        # Clamped to now, so a future-dated entry can't hide everything until then.
+        mark = min(newest[0], run_started_at)
+        if feed_state.high_water_utc is None or mark > feed_state.high_water_utc:
+            feed_state.high_water_utc, feed_state.high_water_uid = mark, newest[1]
 
-        if uids_to_mark_seen:
-            uids_to_mark_seen.sort(key=lambda x: (x[0] is None, x[0] or run_started_at))
-            feed_state.seen_uids.extend([uid for _published, uid in uids_to_mark_seen])
-            if config.seen_uids_per_feed_limit > 0:
-                feed_state.seen_uids = feed_state.seen_uids[
-                    -config.seen_uids_per_feed_limit :
-                ]
+    if warm_start:
+        uids_to_mark_seen = []
+        for entry in reversed(entries):
+            entry_uid = coerce_uid(entry)
+            if entry_uid:
+                uids_to_mark_seen.append((None, entry_uid))
 
-        next_state.feeds[feed_url] = feed_state
+    uids_to_mark_seen.sort(key=lambda x: (x[0] is None, x[0] or run_started_at))
+    seen_added = [uid for _published, uid in uids_to_mark_seen]
+    if seen_added:
+        seen_uids = next_state.feeds.edit(feed_url).seen_uids
+        seen_uids.add_many(seen_added, limit=seen_limit(seen_uids, config))
+    return FeedOutcome(items=new_items, failure=None, seen_added=seen_added)
 
-    new_items.sort(key=lambda item: (item.feed_domain, item.published_utc or run_started_at))
-    return new_items, failures, next_state
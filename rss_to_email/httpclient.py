@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterator, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+from rss_to_email.config import Config
+from rss_to_email.metrics import FeedMetrics
+
+if TYPE_CHECKING:
+    from rss_to_email.async_fetch import AsyncSession
+
+# urllib3 only advertises "br" when a brotli decoder is importable.
+_ACCEPT_ENCODING = "gzip, br" if "br" in ACCEPT_ENCODING.split(",") else "gzip"
+
+
+# What callers keep open between runs for FETCH_ENGINE: a requests.Session for the
+# threads engine, an event loop and aiohttp session for asyncio.
+FetchSession = Union[requests.Session, "AsyncSession"]
+
+
+# The feed record of the request being made on this thread; connections it opens add
+# their setup time to it. Set around a request with timing_connects().
+_connect_record: ContextVar[FeedMetrics | None] = ContextVar("connect_record", default=None)
+
+
+@contextmanager
+def timing_connects(record: FeedMetrics) -> Iterator[None]:
+    token = _connect_record.set(record)
+    try:
+        yield
+    finally:
+        _connect_record.reset(token)
+
+
+@contextmanager
+def _timed_connect() -> Iterator[None]:
+    record = _connect_record.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if record is not None:
+            record.connect_seconds += time.perf_counter() - started
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self) -> None:
+        with _timed_connect():
+            super().connect()
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    # Includes the TLS handshake, which urllib3 does in connect().
+    def connect(self) -> None:
+        with _timed_connect():
+            super().connect()
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    # An HTTPAdapter whose new connections report their DNS, connect and TLS time to
+    # the feed record set by timing_connects().
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+@dataclass(frozen=True)
+class ConnectionStats:
+    connections: int
+    requests: int
+
+
+def default_headers(config: Config) -> dict[str, str]:
+    return {"User-Agent": config.user_agent, "Accept-Encoding": _ACCEPT_ENCODING}
+
+
+def create_session(config: Config) -> requests.Session:
+    session = requests.Session()
+    session.headers.update(default_headers(config))
+    adapter = _TimedAdapter(
+        pool_connections=config.http_pool_hosts,
+        pool_maxsize=config.fetch_per_host_limit,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def create_fetch_session(config: Config) -> FetchSession:
+    if config.fetch_engine == "asyncio":
+        from rss_to_email.async_fetch import AsyncSession
+
+        return AsyncSession(config)
+    return create_session(config)
+
+
+def connection_stats(session: requests.Session) -> ConnectionStats:
+    connections = 0
+    num_requests = 0
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            continue
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            num_requests += pool.num_requests
+    return ConnectionStats(connections=connections, requests=num_requests)
+
+
+def log_connection_reuse(*, before: ConnectionStats, after: ConnectionStats) -> None:
+    opened = max(0, after.connections - before.connections)
+    sent = max(0, after.requests - before.requests)
+    logging.info(
+        "HTTP: %d requests over %d new connections (%d reused).",
+        sent,
+        opened,
+        max(0, sent - opened),
+    )
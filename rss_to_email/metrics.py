@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+@dataclass
+class FeedMetrics:
+    url: str
+    status: int | None = None
+    # connect_seconds is opening new connections: DNS, TCP connect and TLS handshake
+    # (0 when a kept-alive one was reused). fetch_seconds is the rest of the request but
+    # parsing: sending it, waiting for the response and downloading the body.
+    connect_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    parse_seconds: float = 0.0
+    bytes: int = 0
+    # "unchanged" (same body as last time), "hit" (parse cache) or None.
+    parse_cache: str | None = None
+    error: str | None = None
+
+    @contextmanager
+    def parsing(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.parse_seconds += time.perf_counter() - started
+
+
+@dataclass
+class RunMetrics:
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    stages: dict[str, float] = field(default_factory=dict)
+    feeds: dict[str, FeedMetrics] = field(default_factory=dict)
+    new_items: int = 0
+    failures: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    @contextmanager
+    def feed(
+        self, url: str, *, abandoned: threading.Event | None = None
+    ) -> Iterator[FeedMetrics]:
+        # Called from fetch worker threads (or tasks); each feed gets its own record.
+        # One that finishes after its run gave up on it (abandoned is set) is dropped.
+        record = FeedMetrics(url=url)
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as exc:
+            record.error = exc.__class__.__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            record.fetch_seconds = max(
+                0.0, elapsed - record.connect_seconds - record.parse_seconds
+            )
+            with self._lock:
+                if abandoned is None or not abandoned.is_set():
+                    self.feeds[url] = record
+
+    def add_parse_seconds(self, url: str, seconds: float) -> None:
+        # For parses finished after the feed's own record was closed (parse pool).
+        with self._lock:
+            record = self.feeds.get(url)
+            if record is not None:
+                record.parse_seconds += seconds
+
+    def record_failure(self, url: str, exc: BaseException) -> None:
+        # For feeds that never produced a record of their own, e.g. a fetch deadline.
+        with self._lock:
+            self.feeds.setdefault(url, FeedMetrics(url=url, error=exc.__class__.__name__))
+
+    def to_report(self) -> dict[str, object]:
+        with self._lock:
+            feeds = sorted(
+                self.feeds.values(),
+                key=lambda f: f.connect_seconds + f.fetch_seconds + f.parse_seconds,
+                reverse=True,
+            )
+        status_counts: dict[str, int] = {}
+        for feed in feeds:
+            key = str(feed.status) if feed.status is not None else "error"
+            status_counts[key] = status_counts.get(key, 0) + 1
+        return {
+            "started_at": self.started_at.isoformat(),
+            "stages": dict(self.stages),
+            "new_items": self.new_items,
+            "failures": self.failures,
+            "feeds_fetched": len(feeds),
+            "bytes": sum(f.bytes for f in feeds),
+            "status_counts": status_counts,
+            # Slowest first.
+            "feeds": [asdict(f) for f in feeds],
+        }
+
+
+def write_run_report(path: str, metrics: RunMetrics) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metrics.to_report(), f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsExporter:
+    # Prometheus text exposition of the most recent run plus a few process-lifetime
+    # counters. Per-feed series carry a feed="<url>" label so the slowest feeds can be
+    # found with topk().
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last: RunMetrics | None = None
+        self._runs = {"ok": 0, "error": 0}
+        self._new_items_total = 0
+        self._bytes_total = 0
+        self._responses_total: dict[str, int] = {}
+
+    def observe(self, metrics: RunMetrics) -> None:
+        with self._lock:
+            self._last = metrics
+            self._runs["ok"] += 1
+            self._new_items_total += metrics.new_items
+            for feed in list(metrics.feeds.values()):
+                self._bytes_total += feed.bytes
+                key = str(feed.status) if feed.status is not None else "error"
+                self._responses_total[key] = self._responses_total.get(key, 0) + 1
+
+    def observe_error(self) -> None:
+        with self._lock:
+            self._runs["error"] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            last = self._last
+            lines = [
+                "# HELP rss_to_email_runs_total Completed runs by outcome.",
+                "# TYPE rss_to_email_runs_total counter",
+                *(f'rss_to_email_runs_total{{outcome="{k}"}} {v}' for k, v in self._runs.items()),
+                "# HELP rss_to_email_new_items_total New items found across all runs.",
+                "# TYPE rss_to_email_new_items_total counter",
+                f"rss_to_email_new_items_total {self._new_items_total}",
+                "# HELP rss_to_email_fetched_bytes_total Feed body bytes received across all runs.",
+                "# TYPE rss_to_email_fetched_bytes_total counter",
+                f"rss_to_email_fetched_bytes_total {self._bytes_total}",
+                "# HELP rss_to_email_feed_responses_total Feed fetches by HTTP status.",
+                "# TYPE rss_to_email_feed_responses_total counter",
+                *(
+                    f'rss_to_email_feed_responses_total{{status="{k}"}} {v}'
+                    for k, v in sorted(self._responses_total.items())
+                ),
+            ]
+        if last is None:
+            return "\n".join(lines) + "\n"
+
+        feeds = list(last.feeds.values())
+        lines += [
+            "# HELP rss_to_email_last_run_timestamp_seconds Start time of the last completed run.",
+            "# TYPE rss_to_email_last_run_timestamp_seconds gauge",
+            f"rss_to_email_last_run_timestamp_seconds {last.started_at.timestamp():.3f}",
+            "# HELP rss_to_email_last_run_failures Feed failures in the last run.",
+            "# TYPE rss_to_email_last_run_failures gauge",
+            f"rss_to_email_last_run_failures {last.failures}",
+            "# HELP rss_to_email_stage_seconds Duration of each stage in the last run.",
+            "# TYPE rss_to_email_stage_seconds gauge",
+            *(
+                f'rss_to_email_stage_seconds{{stage="{_label(name)}"}} {seconds:.6f}'
+                for name, seconds in last.stages.items()
+            ),
+            "# HELP rss_to_email_feed_connect_seconds Per-feed time opening connections (DNS, connect, TLS) in the last run.",
+            "# TYPE rss_to_email_feed_connect_seconds gauge",
+            *(f'rss_to_email_feed_connect_seconds{{feed="{_label(f.url)}"}} {f.connect_seconds:.6f}' for f in feeds),
+            "# HELP rss_to_email_feed_fetch_seconds Per-feed fetch time (excluding connecting and parsing) in the last run.",
+            "# TYPE rss_to_email_feed_fetch_seconds gauge",
+            *(f'rss_to_email_feed_fetch_seconds{{feed="{_label(f.url)}"}} {f.fetch_seconds:.6f}' for f in feeds),
+            "# HELP rss_to_email_feed_parse_seconds Per-feed parse time in the last run.",
+            "# TYPE rss_to_email_feed_parse_seconds gauge",
+            *(f'rss_to_email_feed_parse_seconds{{feed="{_label(f.url)}"}} {f.parse_seconds:.6f}' for f in feeds),
+            "# HELP rss_to_email_feed_bytes Per-feed body bytes received in the last run.",
+            "# TYPE rss_to_email_feed_bytes gauge",
+            *(f'rss_to_email_feed_bytes{{feed="{_label(f.url)}"}} {f.bytes}' for f in feeds),
+            "# HELP rss_to_email_feed_status Per-feed HTTP status in the last run (0 when no response).",
+            "# TYPE rss_to_email_feed_status gauge",
+            *(f'rss_to_email_feed_status{{feed="{_label(f.url)}"}} {f.status or 0}' for f in feeds),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, *, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        # Imported here: only the scheduler serves metrics, one-shot runs don't.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] not in {"/", "/metrics"}:
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logging.info("Serving metrics on %s:%d/metrics.", host, server.server_address[1])
+        return server
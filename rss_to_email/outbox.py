@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from rss_to_email.config import Config
+from rss_to_email.util import write_atomic
+
+# smtplib and the email package are only needed once there is mail to handle.
+if TYPE_CHECKING:
+    from email.message import EmailMessage
+
+    from rss_to_email.smtp_send import SmtpPool
+
+_MESSAGE_SUFFIX = ".eml"
+_META_SUFFIX = ".json"
+
+
+@dataclass(frozen=True)
+class OutboxEntry:
+    id: str
+    attempts: int = 0
+    next_attempt_utc: datetime | None = None
+    last_error: str | None = None
+
+    def is_due(self, now: datetime) -> bool:
+        return self.next_attempt_utc is None or self.next_attempt_utc <= now
+
+
+class Outbox:
+    # Rendered messages waiting for SMTP: one .eml file per message, plus a .json file
+    # with its retry schedule once a send has failed. Messages are written here before
+    # state advances, so an SMTP outage only delays mail instead of making the next run
+    # fetch everything again. Failed sends are retried with exponential backoff; ones
+    # the server rejects outright (5xx) are moved to failed/.
+
+    def __init__(self, path: str, *, retry_base_seconds: float, retry_max_seconds: float) -> None:
+        self.path = path
+        self._retry_base_seconds = retry_base_seconds
+        self._retry_max_seconds = retry_max_seconds
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Outbox | None":
+        if not config.outbox_path:
+            return None
+        return cls(
+            config.outbox_path,
+            retry_base_seconds=config.outbox_retry_base_seconds,
+            retry_max_seconds=config.outbox_retry_max_seconds,
+        )
+
+    def _file(self, entry_id: str, suffix: str) -> str:
+        return os.path.join(self.path, entry_id + suffix)
+
+    def put(self, messages: list[EmailMessage]) -> list[str]:
+        from rss_to_email.smtp_send import flatten_message
+
+        os.makedirs(self.path, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        ids: list[str] = []
+        for msg in messages:
+            # Sortable by creation time, so the oldest mail goes out first.
+            entry_id = f"{stamp}-{uuid.uuid4().hex[:12]}"
+            write_atomic(self._file(entry_id, _MESSAGE_SUFFIX), flatten_message(msg))
+            ids.append(entry_id)
+        return ids
+
+    def entries(self) -> list[OutboxEntry]:
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        result: list[OutboxEntry] = []
+        for name in sorted(names):
+            if not name.endswith(_MESSAGE_SUFFIX):
+                continue
+            entry_id = name[: -len(_MESSAGE_SUFFIX)]
+            try:
+                with open(self._file(entry_id, _META_SUFFIX), "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except FileNotFoundError:
+                result.append(OutboxEntry(id=entry_id))
+                continue
+            next_attempt = raw.get("next_attempt_utc")
+            result.append(
+                OutboxEntry(
+                    id=entry_id,
+                    attempts=int(raw.get("attempts") or 0),
+                    next_attempt_utc=datetime.fromisoformat(next_attempt) if next_attempt else None,
+                    last_error=raw.get("last_error"),
+                )
+            )
+        return result
+
+    def due(self, now: datetime) -> list[OutboxEntry]:
+        return [entry for entry in self.entries() if entry.is_due(now)]
+
+    def _load(self, entry_id: str) -> EmailMessage:
+        import email
+        import email.policy
+        from email.message import EmailMessage
+
+        with open(self._file(entry_id, _MESSAGE_SUFFIX), "rb") as f:
+            msg = email.message_from_binary_file(f, policy=email.policy.default)
+        assert isinstance(msg, EmailMessage)
+        return msg
+
+    def _remove(self, entry_id: str) -> None:
+        for suffix in (_META_SUFFIX, _MESSAGE_SUFFIX):
+            try:
+                os.remove(self._file(entry_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _reject(self, entry_id: str) -> None:
+        failed_dir = os.path.join(self.path, "failed")
+        os.makedirs(failed_dir, exist_ok=True)
+        for suffix in (_MESSAGE_SUFFIX, _META_SUFFIX):
+            try:
+                os.replace(self._file(entry_id, suffix), os.path.join(failed_dir, entry_id + suffix))
+            except FileNotFoundError:
+                pass
+
+    def _reschedule(self, entry: OutboxEntry, exc: Exception, now: datetime) -> None:
+        attempts = entry.attempts + 1
+        delay = min(self._retry_max_seconds, self._retry_base_seconds * 2 ** (attempts - 1))
+        raw = {
+            "attempts": attempts,
+            "next_attempt_utc": (now + timedelta(seconds=delay)).isoformat(),
+            "last_error": f"{exc.__class__.__name__}: {exc}",
+        }
+        write_atomic(
+            self._file(entry.id, _META_SUFFIX),
+            (json.dumps(raw, indent=2, sort_keys=True) + "\n").encode("utf-8"),
+        )
+
+    def drain(self, smtp: SmtpPool, *, now: datetime | None = None) -> tuple[int, int]:
+        # Sends every message whose retry time has come. Returns (sent, still queued).
+        from rss_to_email.smtp_send import is_permanent_failure
+
+        if now is None:
+            now = datetime.now(timezone.utc)
+        entries = self.entries()
+        due = [entry for entry in entries if entry.is_due(now)]
+        if not due:
+            return 0, len(entries)
+
+        messages = [self._load(entry.id) for entry in due]
+        sent = 0
+        for entry, msg, exc in zip(due, messages, smtp.send_each(messages)):
+            if exc is None:
+                self._remove(entry.id)
+                sent += 1
+            elif is_permanent_failure(exc):
+                logging.error(
+                    "Mail to %s rejected (%s); moved %s to %s.",
+                    msg["To"],
+                    exc,
+                    entry.id,
+                    os.path.join(self.path, "failed"),
+                )
+                self._reject(entry.id)
+            else:
+                self._reschedule(entry, exc, now)
+        remaining = len(self.entries())
+        if remaining:
+            logging.warning("%d message(s) still queued in outbox %s.", remaining, self.path)
+        return sent, remaining
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import feedparser
+
+from rss_to_email.util import safe_get
+
+# Everything fetch_new_items and the poller read from a parse result.
+_FEED_KEYS = ("title", "ttl", "sy_updateperiod", "sy_updatefrequency")
+_ENTRY_KEYS = ("id", "guid", "link", "title", "published_parsed", "updated_parsed")
+
+
+def body_digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def compact(parsed: feedparser.FeedParserDict) -> feedparser.FeedParserDict:
+    feed = safe_get(parsed, "feed") or {}
+    return feedparser.FeedParserDict(
+        feed=feedparser.FeedParserDict(
+            {key: feed[key] for key in _FEED_KEYS if feed.get(key) is not None}
+        ),
+        entries=[
+            feedparser.FeedParserDict(
+                {key: entry[key] for key in _ENTRY_KEYS if entry.get(key) is not None}
+            )
+            for entry in parsed.get("entries") or []
+        ],
+    )
+
+
+class ParseCache:
+    # LRU of body digest -> compacted parse result, shared by the fetch workers of a
+    # long-running process. It catches bodies that differ from a feed's previous one but
+    # were parsed before: mirrors of the same feed, or CDNs flapping between versions.
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, feedparser.FeedParserDict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> feedparser.FeedParserDict | None:
+        with self._lock:
+            parsed = self._entries.get(digest)
+            if parsed is not None:
+                self._entries.move_to_end(digest)
+            return parsed
+
+    def put(self, digest: str, parsed: feedparser.FeedParserDict) -> None:
+        if self._max_entries <= 0:
+            return
+        entry = compact(parsed)
+        with self._lock:
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
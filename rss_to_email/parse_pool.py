@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import feedparser
+
+from rss_to_email.parse_cache import compact
+from rss_to_email.util import coerce_uid
+
+# (feed fields, [(uid, title, link, published_parsed)], seconds spent parsing)
+Extracted = tuple[dict[str, Any], list[tuple[Any, ...]], float]
+
+
+def parse_extracted(body: bytes) -> Extracted:
+    # Runs in a worker process. Only the fields fetch_new_items and the poller read
+    # are sent back, so the pickled result is a small fraction of a FeedParserDict.
+    started = time.perf_counter()
+    parsed = compact(feedparser.parse(body))
+    entries = [
+        (
+            coerce_uid(entry),
+            entry.get("title"),
+            entry.get("link"),
+            entry.get("published_parsed") or entry.get("updated_parsed"),
+        )
+        for entry in parsed.entries
+    ]
+    return dict(parsed.feed), entries, time.perf_counter() - started
+
+
+def from_extracted(feed: dict[str, Any], entries: list[tuple[Any, ...]]) -> feedparser.FeedParserDict:
+    result: list[feedparser.FeedParserDict] = []
+    for uid, title, link, published in entries:
+        entry = feedparser.FeedParserDict()
+        if uid is not None:
+            entry["id"] = uid
+        if title is not None:
+            entry["title"] = title
+        if link is not None:
+            entry["link"] = link
+        if published is not None:
+            entry["published_parsed"] = published
+        result.append(entry)
+    return feedparser.FeedParserDict(feed=feedparser.FeedParserDict(feed), entries=result)
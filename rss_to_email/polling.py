@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from rss_to_email.config import Config
+from rss_to_email.state import FeedState
+from rss_to_email.util import datetime_from_struct_time, safe_get
+
+_SY_PERIOD_SECONDS = {
+    "hourly": 3600.0,
+    "daily": 86400.0,
+    "weekly": 7 * 86400.0,
+    "monthly": 30 * 86400.0,
+    "yearly": 365 * 86400.0,
+}
+_MAX_AGE_RE = re.compile(r"(?:^|[,\s])max-age\s*=\s*(\d+)", re.IGNORECASE)
+_RECENT_ENTRIES = 10
+
+
+def is_due(feed_state: FeedState | None, now: datetime) -> bool:
+    return feed_state is None or feed_state.next_poll_utc is None or feed_state.next_poll_utc <= now
+
+
+def in_backoff(feed_state: FeedState | None, now: datetime) -> bool:
+    return (
+        feed_state is not None
+        and feed_state.retry_at_utc is not None
+        and feed_state.retry_at_utc > now
+    )
+
+
+def should_fetch(feed_state: FeedState | None, now: datetime, config: Config) -> bool:
+    # The same test _fetch_due applies, for deciding up front whether to run at all.
+    if config.adaptive_polling and not is_due(feed_state, now):
+        return False
+    return not in_backoff(feed_state, now)
+
+
+def retry_after_seconds(headers: Mapping[str, str], now: datetime) -> float | None:
+    # Retry-After is either delta-seconds or an HTTP-date.
+    retry_after = (headers.get("Retry-After") or "").strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    if not retry_after:
+        return None
+    # Imported here, like statistics below, to keep this module cheap for run_once's
+    # check of whether anything is due.
+    from email.utils import parsedate_to_datetime
+
+    try:
+        when = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def failure_backoff(
+    *,
+    failure_count: int,
+    headers: Mapping[str, str] | None,
+    now: datetime,
+    config: Config,
+) -> datetime | None:
+    # Doubles with every consecutive failure, is never shorter than a Retry-After sent
+    # with the error, and never longer than failure_backoff_max_seconds.
+    delay = 0.0
+    if config.failure_backoff_base_seconds > 0:
+        delay = config.failure_backoff_base_seconds * 2.0 ** min(failure_count - 1, 32)
+    hint = retry_after_seconds(headers, now) if headers is not None else None
+    if hint is not None:
+        delay = max(delay, hint)
+    delay = min(delay, config.failure_backoff_max_seconds)
+    return now + timedelta(seconds=delay) if delay > 0 else None
+
+
+def header_min_interval(headers: Mapping[str, str], now: datetime) -> float | None:
+    # Retry-After and Cache-Control max-age both say how long the server would like us
+    # to stay away.
+    hints: list[float] = []
+    retry_after = retry_after_seconds(headers, now)
+    if retry_after is not None:
+        hints.append(retry_after)
+    match = _MAX_AGE_RE.search(headers.get("Cache-Control") or "")
+    if match:
+        hints.append(float(match.group(1)))
+    return max(hints) if hints else None
+
+
+def _feed_min_interval(parsed: Any) -> float | None:
+    hints: list[float] = []
+    ttl = str(safe_get(parsed, "feed", "ttl") or "").strip()
+    if ttl.isdigit():
+        hints.append(int(ttl) * 60.0)
+    period = str(safe_get(parsed, "feed", "sy_updateperiod") or "").strip().lower()
+    if period in _SY_PERIOD_SECONDS:
+        frequency = str(safe_get(parsed, "feed", "sy_updatefrequency") or "1").strip()
+        per_period = int(frequency) if frequency.isdigit() and int(frequency) > 0 else 1
+        hints.append(_SY_PERIOD_SECONDS[period] / per_period)
+    return max(hints) if hints else None
+
+
+def _observed_interval(entries: list[Any]) -> float | None:
+    published = sorted(
+        (
+            dt
+            for dt in (
+                datetime_from_struct_time(
+                    entry.get("published_parsed") or entry.get("updated_parsed")
+                )
+                for entry in entries
+            )
+            if dt is not None
+        ),
+        reverse=True,
+    )[:_RECENT_ENTRIES]
+    gaps = [(a - b).total_seconds() for a, b in zip(published, published[1:])]
+    gaps = [gap for gap in gaps if gap > 0]
+    if not gaps:
+        return None
+    import statistics
+
+    return statistics.median(gaps)
+
+
+def next_poll(
+    *,
+    feed_state: FeedState | None,
+    parsed: Any | None,
+    entries: list[Any],
+    header_interval: float | None,
+    now: datetime,
+    config: Config,
+) -> tuple[datetime, float]:
+    # Poll at half the observed publish interval so a new item waits at most about half
+    # a gap, but never more often than the feed's ttl/sy:updatePeriod or the response
+    # headers ask for. A 304 carries no entries, so the previous interval is reused.
+    if parsed is None:
+        interval = feed_state.poll_interval_seconds if feed_state is not None else None
+    else:
+        observed = _observed_interval(entries)
+        interval = observed / 2 if observed is not None else None
+        feed_hint = _feed_min_interval(parsed)
+        if feed_hint is not None:
+            interval = max(interval or 0.0, feed_hint)
+
+    interval = interval if interval is not None else config.poll_min_interval_seconds
+    interval = min(max(interval, config.poll_min_interval_seconds), config.poll_max_interval_seconds)
+    # Header hints only push out this one poll; they are not remembered as the interval.
+    wait = max(interval, header_interval) if header_interval is not None else interval
+    return now + timedelta(seconds=wait), interval
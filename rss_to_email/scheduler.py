@@ -4,10 +4,21 @@ import logging
 import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import partial
+from typing import Callable
 
 from croniter import croniter
 
-from rss_to_email.app import run_once
+from rss_to_email.app import MergeResult, RunResult, drain_outbox, run_merge, run_once
+from rss_to_email.checkpoint import RunLocked
+from rss_to_email.config import Config, load_config
+from rss_to_email.daemon import Daemon
+from rss_to_email.httpclient import FetchSession, create_fetch_session
+from rss_to_email.metrics import MetricsExporter
+from rss_to_email.outbox import Outbox
+from rss_to_email.parse_cache import ParseCache
+from rss_to_email.smtp_send import SmtpPool
+from rss_to_email.tenants import TenantsRunResult, load_tenants, run_tenants
 
 
 @dataclass(frozen=True)
@@ -15,13 +26,18 @@ class CronConfig:
     schedule: str
     immediate: bool
     max_sleep_seconds: float
+    daemon: bool = False
+    metrics_port: int | None = None
+    metrics_host: str = "127.0.0.1"
 
 
 def run_on_schedule(
     *,
-    feed_list_path: str,
-    state_path: str,
+    feed_list_path: str | None,
+    state_path: str | None,
     cron_config: CronConfig,
+    profiles_path: str | None = None,
+    merge: bool = False,
 ) -> None:
     schedule = cron_config.schedule.strip()
     if not schedule:
@@ -29,9 +45,106 @@ def run_on_schedule(
 
     logging.info("Scheduler enabled with CRON_SCHEDULE=%r (UTC).", schedule)
 
+    daemon: Daemon | None = None
+    smtp: SmtpPool | None = None
+    session: FetchSession | None = None
+    run: Callable[[], RunResult | TenantsRunResult | MergeResult]
+    idle: Callable[[], None] | None = None
+    if merge:
+        if cron_config.daemon or profiles_path is not None:
+            raise ValueError("The merge step doesn't support DAEMON_MODE or PROFILES_PATH.")
+        assert feed_list_path is not None and state_path is not None
+        config = load_config(feed_list_path=feed_list_path, state_path=state_path)
+        smtp = SmtpPool(config.smtp)
+        idle = _outbox_drainer(config, smtp)
+        run = partial(run_merge, feed_list_path=feed_list_path, state_path=state_path, smtp=smtp)
+    elif profiles_path is not None:
+        if cron_config.daemon:
+            raise ValueError("DAEMON_MODE is not supported with PROFILES_PATH.")
+        config = load_tenants(profiles_path)[0].config
+        smtp = SmtpPool(config.smtp)
+        idle = _outbox_drainer(config, smtp)
+        session = create_fetch_session(config)
+        run = partial(
+            run_tenants,
+            profiles_path=profiles_path,
+            session=session,
+            smtp=smtp,
+            parse_cache=ParseCache(config.parse_cache_entries),
+        )
+    elif cron_config.daemon:
+        assert feed_list_path is not None and state_path is not None
+        logging.info("DAEMON_MODE=true: keeping config, state and connections warm.")
+        daemon = Daemon(feed_list_path=feed_list_path, state_path=state_path)
+        run = daemon.tick
+        idle = daemon.drain_outbox
+    else:
+        assert feed_list_path is not None and state_path is not None
+        # One session, SMTP pool and parse cache for the life of the process so
+        # keep-alive connections and parsed bodies survive between ticks.
+        config = load_config(feed_list_path=feed_list_path, state_path=state_path)
+        smtp = SmtpPool(config.smtp)
+        idle = _outbox_drainer(config, smtp)
+        session = create_fetch_session(config)
+        run = partial(
+            run_once,
+            feed_list_path=feed_list_path,
+            state_path=state_path,
+            session=session,
+            smtp=smtp,
+            parse_cache=ParseCache(config.parse_cache_entries),
+        )
+
+    if cron_config.metrics_port is not None:
+        run = _exported(run, host=cron_config.metrics_host, port=cron_config.metrics_port)
+
+    try:
+        _loop(schedule=schedule, cron_config=cron_config, run=run, idle=idle)
+    finally:
+        if daemon is not None:
+            daemon.close()
+        if smtp is not None:
+            smtp.close()
+        if session is not None:
+            session.close()
+
+
+def _outbox_drainer(config: Config, smtp: SmtpPool) -> Callable[[], None] | None:
+    # Between runs, keep retrying queued mail on its backoff schedule.
+    outbox = Outbox.from_config(config)
+    if outbox is None:
+        return None
+    return partial(drain_outbox, outbox, smtp=smtp, config=config)
+
+
+def _exported(
+    run: Callable[[], RunResult | TenantsRunResult | MergeResult], *, host: str, port: int
+) -> Callable[[], RunResult | TenantsRunResult | MergeResult]:
+    exporter = MetricsExporter()
+    exporter.serve(port, host=host)
+
+    def run_and_observe() -> RunResult | TenantsRunResult | MergeResult:
+        try:
+            result = run()
+        except Exception:
+            exporter.observe_error()
+            raise
+        exporter.observe(result.metrics)
+        return result
+
+    return run_and_observe
+
+
+def _loop(
+    *,
+    schedule: str,
+    cron_config: CronConfig,
+    run: Callable[[], object],
+    idle: Callable[[], None] | None = None,
+) -> None:
     if cron_config.immediate:
         logging.info("CRON_IMMEDIATE=true: running once at startup.")
-        run_once(feed_list_path=feed_list_path, state_path=state_path)
+        _run_unless_locked(run)
 
     while True:
         now = datetime.now(timezone.utc)
@@ -46,5 +159,18 @@ def run_on_schedule(
             chunk = min(remaining, cron_config.max_sleep_seconds)
             time.sleep(chunk)
             remaining -= chunk
+            if idle is not None and remaining > 0:
+                try:
+                    idle()
+                except Exception:
+                    logging.exception("Outbox drain failed.")
+
+        _run_unless_locked(run)
+
 
-        run_once(feed_list_path=feed_list_path, state_path=state_path)
+def _run_unless_locked(run: Callable[[], object]) -> None:
+    # A tick that finds the previous one (or another process) still running is skipped.
+    try:
+        run()
+    except RunLocked as exc:
+        logging.warning("Skipping this run: %s", exc)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import glob
+import logging
+import os
+
+from rss_to_email.state import FeedState, State, load_state, uid_hash
+
+_SHARD_MARKER = ".shard-"
+
+
+def shard_of(url: str, count: int) -> int:
+    # Jump consistent hash (Lamping & Veach): going from M to M+1 shards only moves the
+    # 1/(M+1) of feeds that land on the new shard, and nothing moves between the others.
+    key = uid_hash(url)
+    shard, candidate = -1, 0
+    while candidate < count:
+        shard = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return shard
+
+
+def shard_feed_urls(feed_urls: list[str], *, index: int, count: int) -> list[str]:
+    return [url for url in feed_urls if shard_of(url, count) == index]
+
+
+def shard_state_path(state_path: str, index: int) -> str:
+    # state.json -> state.shard-3.json; partitions live next to each other so a shard
+    # can pick up feeds that another one used to own.
+    root, ext = os.path.splitext(state_path)
+    return f"{root}{_SHARD_MARKER}{index}{ext}"
+
+
+def _other_partitions(partition_path: str) -> list[str]:
+    root, ext = os.path.splitext(partition_path)
+    base_root = root.rsplit(_SHARD_MARKER, 1)[0]
+    paths = sorted(glob.glob(f"{glob.escape(base_root)}{_SHARD_MARKER}*{ext}"))
+    # The unsharded file, for feeds that were never fetched by a shard.
+    paths.append(base_root + ext)
+    return [path for path in paths if path != partition_path and os.path.exists(path)]
+
+
+def _freshest(a: FeedState | None, b: FeedState) -> FeedState:
+    if a is None or a.last_success_utc is None:
+        return b
+    if b.last_success_utc is None or b.last_success_utc <= a.last_success_utc:
+        return a
+    return b
+
+
+def load_shard_state(partition_path: str, feed_urls: list[str]) -> State:
+    # This shard's partition, plus the state of feeds it has just taken over (after
+    # SHARD_COUNT changed) copied from whichever partition read them last. The copies
+    # are saved into this partition with the next run; the old entries are left alone.
+    state = load_state(partition_path)
+    missing = [url for url in feed_urls if url not in state.feeds]
+    if not missing:
+        return state
+
+    adopted: dict[str, FeedState] = {}
+    sibling_last_runs = []
+    for path in _other_partitions(partition_path):
+        sibling = load_state(path)
+        if sibling.last_run_utc is not None:
+            sibling_last_runs.append(sibling.last_run_utc)
+        for url in missing:
+            # A feed that moved permanently brings along the state it moved to, which
+            # the same shard saved next to it.
+            key: str | None = url
+            visited: set[str] = set()
+            while key is not None and key not in state.feeds and key not in visited:
+                visited.add(key)
+                feed_state = sibling.feeds.get(key)
+                if feed_state is None:
+                    break
+                adopted[key] = _freshest(adopted.get(key), feed_state)
+                key = feed_state.canonical_url
+
+    for url, feed_state in adopted.items():
+        state.feeds[url] = feed_state
+    # A new shard joining existing ones is not a first run: it must not warm-start and
+    # drop whatever its feeds published since the others last ran.
+    if state.last_run_utc is None and sibling_last_runs:
+        state.last_run_utc = min(sibling_last_runs)
+    if adopted:
+        logging.info("Took over state for %d feeds from other shards.", len(adopted))
+    return state
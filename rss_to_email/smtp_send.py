@@ -1,35 +1,281 @@
 from __future__ import annotations
 
+import io
+import logging
 import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.generator import BytesGenerator
 from email.message import EmailMessage
+from email.utils import getaddresses, parseaddr
 
 from rss_to_email.config import SmtpConfig
 
+# A connection used more recently than this is assumed alive and not NOOP-checked.
+_IDLE_CHECK_SECONDS = 10.0
 
-def send_email(
+
+def recipients(smtp_config: SmtpConfig) -> list[str]:
+    return [addr.strip() for addr in smtp_config.mail_to.split(",") if addr.strip()]
+
+
+def build_message(
     *,
     smtp_config: SmtpConfig,
     subject: str,
     text_body: str,
     html_body: str,
-) -> None:
+    mail_to: str | None = None,
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = smtp_config.mail_from
-    msg["To"] = smtp_config.mail_to
+    msg["To"] = mail_to if mail_to is not None else smtp_config.mail_to
     msg["Subject"] = subject
     msg.set_content(text_body)
     msg.add_alternative(html_body, subtype="html")
+    return msg
 
-    if smtp_config.use_ssl:
-        with smtplib.SMTP_SSL(smtp_config.host, smtp_config.port) as server:
-            server.login(smtp_config.username, smtp_config.password)
-            server.send_message(msg)
-        return
 
-    with smtplib.SMTP(smtp_config.host, smtp_config.port) as server:
-        server.ehlo()
-        if smtp_config.use_tls:
-            server.starttls()
+def build_messages(
+    *,
+    smtp_config: SmtpConfig,
+    subject: str,
+    text_body: str,
+    html_body: str,
+) -> list[EmailMessage]:
+    # One message per SMTP_TO address, so recipients don't see each other.
+    return [
+        build_message(
+            smtp_config=smtp_config,
+            subject=subject,
+            text_body=text_body,
+            html_body=html_body,
+            mail_to=addr,
+        )
+        for addr in recipients(smtp_config)
+    ]
+
+
+def _connect(smtp_config: SmtpConfig) -> smtplib.SMTP:
+    server: smtplib.SMTP
+    if smtp_config.use_ssl:
+        server = smtplib.SMTP_SSL(smtp_config.host, smtp_config.port)
+    else:
+        server = smtplib.SMTP(smtp_config.host, smtp_config.port)
+    try:
+        if not smtp_config.use_ssl:
             server.ehlo()
+            if smtp_config.use_tls:
+                server.starttls()
+                server.ehlo()
         server.login(smtp_config.username, smtp_config.password)
-        server.send_message(msg)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def flatten_message(msg: EmailMessage) -> bytes:
+    buf = io.BytesIO()
+    BytesGenerator(buf).flatten(msg, linesep="\r\n")
+    return buf.getvalue()
+
+
+def _envelope(server: smtplib.SMTP, msg: EmailMessage) -> tuple[str, list[str], bytes, list[str]]:
+    # (sender, recipients, message bytes, MAIL FROM options), worked out as
+    # SMTP.send_message does: non-ASCII addresses need SMTPUTF8 and a UTF-8 flattening.
+    # The 8bit parts set_content produces for non-ASCII text are also declared with
+    # BODY=8BITMIME when the server offers it.
+    from_addr = parseaddr(msg["From"])[1]
+    to_addrs = [addr for _name, addr in getaddresses(msg.get_all("To", []))]
+    if not "".join([from_addr, *to_addrs]).isascii():
+        if not server.has_extn("smtputf8"):
+            raise smtplib.SMTPNotSupportedError(
+                "One or more addresses require internationalized email support, but the"
+                " server does not advertise the SMTPUTF8 capability"
+            )
+        buf = io.BytesIO()
+        BytesGenerator(buf, policy=msg.policy.clone(utf8=True)).flatten(msg, linesep="\r\n")
+        return from_addr, to_addrs, buf.getvalue(), ["SMTPUTF8", "BODY=8BITMIME"]
+    data = flatten_message(msg)
+    options = ["BODY=8BITMIME"] if server.has_extn("8bitmime") and not data.isascii() else []
+    return from_addr, to_addrs, data, options
+
+
+def _send_message(server: smtplib.SMTP, msg: EmailMessage) -> None:
+    from_addr, to_addrs, data, mail_options = _envelope(server, msg)
+    if not server.has_extn("pipelining"):
+        server.sendmail(from_addr, to_addrs, data, mail_options)
+        return
+
+    # RFC 2920: MAIL FROM and all RCPT TOs are written back to back and their replies
+    # read afterwards, saving a round trip per command. smtplib has no pipelining of
+    # its own, so this mirrors SMTP.mail and SMTP.sendmail's checks by hand.
+    if server.has_extn("size"):
+        mail_options.insert(0, f"SIZE={len(data)}")
+    if "SMTPUTF8" in mail_options:
+        server.command_encoding = "utf-8"
+    params = "".join(f" {option}" for option in mail_options)
+    server.putcmd("mail", f"FROM:{smtplib.quoteaddr(from_addr)}{params}")
+    for addr in to_addrs:
+        server.putcmd("rcpt", f"TO:{smtplib.quoteaddr(addr)}")
+    mail_reply = server.getreply()
+    rcpt_replies = [server.getreply() for _addr in to_addrs]
+
+    if mail_reply[0] != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], from_addr)
+    refused = {
+        addr: reply for addr, reply in zip(to_addrs, rcpt_replies) if reply[0] not in {250, 251}
+    }
+    if len(refused) == len(to_addrs):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, resp = server.data(data)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+
+class SmtpConnection:
+    # An authenticated connection kept open between sends. After max_messages sends it
+    # is closed and reopened, as many servers throttle or drop long sessions. A
+    # connection that sat idle is checked with NOOP first and replaced transparently
+    # if the server has dropped it.
+
+    def __init__(self, smtp_config: SmtpConfig) -> None:
+        self._config = smtp_config
+        self._server: smtplib.SMTP | None = None
+        self._sent = 0
+        self._last_used = 0.0
+
+    def _ensure_connected(self) -> smtplib.SMTP:
+        if self._server is not None:
+            if time.monotonic() - self._last_used < _IDLE_CHECK_SECONDS:
+                return self._server
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            logging.info("SMTP connection went stale; reconnecting.")
+            self.close()
+        self._server = _connect(self._config)
+        return self._server
+
+    def send(self, msg: EmailMessage) -> None:
+        limit = self._config.max_messages_per_connection
+        if self._server is not None and limit > 0 and self._sent >= limit:
+            logging.debug("Sent %d messages on this SMTP connection; reconnecting.", self._sent)
+            self.close()
+        server = self._ensure_connected()
+        try:
+            _send_message(server, msg)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            _send_message(self._ensure_connected(), msg)
+        self._sent += 1
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+        self._sent = 0
+
+
+class SmtpDeliveryError(smtplib.SMTPException):
+    def __init__(self, failures: list[str]) -> None:
+        super().__init__(f"{len(failures)} message(s) not delivered: {'; '.join(failures)}")
+        self.failures = failures
+
+
+class SmtpPool:
+    # Up to smtp_config.connections SmtpConnections, kept open between deliveries. A
+    # batch is spread over them round-robin; every message is attempted before any
+    # failures are raised together.
+
+    def __init__(self, smtp_config: SmtpConfig) -> None:
+        self._connections = [
+            SmtpConnection(smtp_config) for _ in range(max(1, smtp_config.connections))
+        ]
+
+    @staticmethod
+    def _send_batch(
+        connection: SmtpConnection, batch: list[tuple[int, EmailMessage]]
+    ) -> list[tuple[int, Exception]]:
+        errors: list[tuple[int, Exception]] = []
+        for i, msg in batch:
+            try:
+                connection.send(msg)
+            except (smtplib.SMTPException, OSError) as exc:
+                logging.warning("Failed to send to %s: %s", msg["To"], exc)
+                errors.append((i, exc))
+        return errors
+
+    def send_each(self, messages: list[EmailMessage]) -> list[Exception | None]:
+        # The outcome of every message, in order: None once it was accepted.
+        indexed = list(enumerate(messages))
+        batches = [
+            (connection, indexed[i :: len(self._connections)])
+            for i, connection in enumerate(self._connections)
+        ]
+        batches = [(connection, batch) for connection, batch in batches if batch]
+        errors: list[tuple[int, Exception]] = []
+        if len(batches) == 1:
+            errors = self._send_batch(*batches[0])
+        elif batches:
+            with ThreadPoolExecutor(max_workers=len(batches), thread_name_prefix="smtp") as executor:
+                results = executor.map(lambda cb: self._send_batch(*cb), batches)
+                errors = [e for batch_errors in results for e in batch_errors]
+        outcomes: list[Exception | None] = [None] * len(messages)
+        for i, exc in errors:
+            outcomes[i] = exc
+        return outcomes
+
+    def deliver(self, messages: list[EmailMessage]) -> None:
+        failures = [
+            f"{msg['To']}: {exc.__class__.__name__}: {exc}"
+            for msg, exc in zip(messages, self.send_each(messages))
+            if exc is not None
+        ]
+        if failures:
+            raise SmtpDeliveryError(failures)
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.close()
+
+
+def is_permanent_failure(exc: Exception) -> bool:
+    # 5xx replies to a message won't go away by retrying it. A failed login is about
+    # the account, not the message, so it stays retryable.
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _msg in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def send_email(
+    *,
+    smtp_config: SmtpConfig,
+    subject: str,
+    text_body: str,
+    html_body: str,
+) -> None:
+    messages = build_messages(
+        smtp_config=smtp_config,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+    )
+    pool = SmtpPool(smtp_config)
+    try:
+        pool.deliver(messages)
+    finally:
+        pool.close()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from rss_to_email.config import Config
+from rss_to_email.util import write_atomic
+
+if TYPE_CHECKING:
+    from rss_to_email.feeds import FeedItem
+
+_BATCH_SUFFIX = ".json"
+
+
+@dataclass(frozen=True)
+class SpoolBatch:
+    id: str
+    shard_index: int
+    run_started_at: datetime
+    items: list[FeedItem]
+    failures: list[str]
+
+
+class Spool:
+    # Where sharded workers leave their results for the merge step: one JSON file per
+    # worker run with its new items and failures. A worker writes its batch before
+    # saving state, and the merge step removes batches only once their digest has been
+    # sent or queued, so a crash on either side delays items rather than losing them.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Spool | None":
+        if not config.spool_path:
+            return None
+        return cls(config.spool_path)
+
+    def put(
+        self,
+        *,
+        shard_index: int,
+        run_started_at: datetime,
+        items: list[FeedItem],
+        failures: list[str],
+    ) -> str:
+        from rss_to_email.feeds import item_to_raw
+
+        os.makedirs(self.path, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        batch_id = f"{stamp}-shard{shard_index}-{uuid.uuid4().hex[:12]}"
+        raw = {
+            "shard_index": shard_index,
+            "run_started_at": run_started_at.isoformat(),
+            "items": [item_to_raw(item) for item in items],
+            "failures": failures,
+        }
+        write_atomic(
+            os.path.join(self.path, batch_id + _BATCH_SUFFIX),
+            json.dumps(raw, separators=(",", ":")).encode("utf-8"),
+        )
+        return batch_id
+
+    def batches(self) -> list[SpoolBatch]:
+        from rss_to_email.feeds import item_from_raw
+
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        result: list[SpoolBatch] = []
+        for name in sorted(names):
+            if not name.endswith(_BATCH_SUFFIX):
+                continue
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            result.append(
+                SpoolBatch(
+                    id=name[: -len(_BATCH_SUFFIX)],
+                    shard_index=int(raw["shard_index"]),
+                    run_started_at=datetime.fromisoformat(raw["run_started_at"]),
+                    items=[item_from_raw(item) for item in raw.get("items") or []],
+                    failures=list(raw.get("failures") or []),
+                )
+            )
+        return result
+
+    def remove(self, batch_ids: list[str]) -> None:
+        for batch_id in batch_ids:
+            try:
+                os.remove(os.path.join(self.path, batch_id + _BATCH_SUFFIX))
+            except FileNotFoundError:
+                pass
@@ -1,28 +1,287 @@
 from __future__ import annotations
 
+import base64
+import hashlib
 import json
+import logging
 import os
-from dataclasses import dataclass
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from dataclasses import dataclass, field, fields, replace
 from datetime import datetime, timezone
+from itertools import islice
+from typing import Any
+
+
+class SeenUids:
+    # Insertion-ordered set: O(1) membership, oldest-first eviction. copy() shares the
+    # underlying dict until one side is modified.
+    __slots__ = ("_uids", "_shared")
+
+    def __init__(self, uids: Iterable[str] = ()) -> None:
+        self._uids: dict[str, None] = dict.fromkeys(uids)
+        self._shared = False
+
+    def __contains__(self, uid: object) -> bool:
+        return uid in self._uids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._uids)
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SeenUids):
+            return NotImplemented
+        return list(self._uids) == list(other._uids)
+
+    def __repr__(self) -> str:
+        return f"SeenUids({list(self._uids)!r})"
+
+    def copy(self) -> "SeenUids":
+        new = SeenUids()
+        new._uids = self._uids
+        new._shared = self._shared = True
+        return new
+
+    def add_many(self, uids: Iterable[str], *, limit: int) -> None:
+        if self._shared:
+            self._uids = self._uids.copy()
+            self._shared = False
+        for uid in uids:
+            self._uids.pop(uid, None)
+            self._uids[uid] = None
+        excess = len(self._uids) - limit
+        if limit > 0 and excess > 0:
+            for uid in list(islice(self._uids, excess)):
+                del self._uids[uid]
+
+
+def uid_hash(uid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(uid.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashedSeenUids:
+    # SeenUids for very deep histories: 64-bit hashes of the UIDs in two arrays, one in
+    # insertion order (for oldest-first eviction) and one sorted (for bisect lookups).
+    # That is 16 bytes per UID instead of a str object and a dict slot. The UIDs
+    # themselves are not kept, so a history can't be converted back.
+    __slots__ = ("_order", "_sorted", "_shared")
+
+    def __init__(self, hashes: Iterable[int] = ()) -> None:
+        self._order = array("Q", dict.fromkeys(hashes))
+        self._sorted = array("Q", sorted(self._order))
+        self._shared = False
+
+    @classmethod
+    def from_uids(cls, uids: Iterable[str]) -> "HashedSeenUids":
+        return cls(uid_hash(uid) for uid in uids)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HashedSeenUids":
+        hashes = array("Q")
+        hashes.frombytes(data)
+        if sys.byteorder != "little":
+            hashes.byteswap()
+        return cls(hashes)
+
+    def to_bytes(self) -> bytes:
+        if sys.byteorder == "little":
+            return self._order.tobytes()
+        swapped = array("Q", self._order)
+        swapped.byteswap()
+        return swapped.tobytes()
+
+    def _find(self, h: int) -> int | None:
+        i = bisect_left(self._sorted, h)
+        return i if i < len(self._sorted) and self._sorted[i] == h else None
+
+    def __contains__(self, uid: object) -> bool:
+        return isinstance(uid, str) and self._find(uid_hash(uid)) is not None
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, HashedSeenUids):
+            return NotImplemented
+        return self._order == other._order
+
+    def __repr__(self) -> str:
+        return f"HashedSeenUids(<{len(self._order)} hashes>)"
+
+    def copy(self) -> "HashedSeenUids":
+        new = HashedSeenUids()
+        new._order, new._sorted = self._order, self._sorted
+        new._shared = self._shared = True
+        return new
+
+    def add_many(self, uids: Iterable[str], *, limit: int) -> None:
+        if self._shared:
+            self._order, self._sorted = array("Q", self._order), array("Q", self._sorted)
+            self._shared = False
+        for uid in uids:
+            h = uid_hash(uid)
+            i = bisect_left(self._sorted, h)
+            if i < len(self._sorted) and self._sorted[i] == h:
+                self._order.remove(h)
+            else:
+                self._sorted.insert(i, h)
+            self._order.append(h)
+        excess = len(self._order) - limit
+        if limit > 0 and excess > 0:
+            for h in self._order[:excess]:
+                i = self._find(h)
+                if i is not None:
+                    del self._sorted[i]
+            del self._order[:excess]
 
 
 @dataclass
 class FeedState:
-    seen_uids: list[str]
+    seen_uids: SeenUids | HashedSeenUids = field(default_factory=SeenUids)
+    etag: str | None = None
+    last_modified: str | None = None
+    last_success_utc: datetime | None = None
+    next_poll_utc: datetime | None = None
+    poll_interval_seconds: float | None = None
+    content_digest: str | None = None
+    # Publish time (capped at the time it was read) and UID of the newest entry seen.
+    high_water_utc: datetime | None = None
+    high_water_uid: str | None = None
+    # Consecutive failed fetches, and when the feed may be tried again.
+    failure_count: int = 0
+    retry_at_utc: datetime | None = None
+    # Set when the feed permanently redirected (301/308): its state has moved to this
+    # URL, which is fetched in its place. Nothing else is kept under the old URL.
+    canonical_url: str | None = None
+
+    def copy(self) -> "FeedState":
+        return replace(self, seen_uids=self.seen_uids.copy())
+
+
+class FeedStates(MutableMapping[str, FeedState]):
+    # Copy-on-write view of per-feed state. Reads fall through to a shared base that is
+    # never mutated; writes and feeds handed out by edit() live in an overlay, so only
+    # feeds that change during a run are duplicated. origin names the store the base
+    # was loaded from, letting that store write back just the changed feeds.
+
+    def __init__(
+        self, base: Mapping[str, FeedState] | None = None, *, origin: str | None = None
+    ) -> None:
+        self._base: Mapping[str, FeedState] = base if base is not None else {}
+        self._changed: dict[str, FeedState] = {}
+        self._deleted: set[str] = set()
+        self.origin = origin
+
+    def __getitem__(self, url: str) -> FeedState:
+        if url in self._changed:
+            return self._changed[url]
+        if url in self._deleted:
+            raise KeyError(url)
+        return self._base[url]
+
+    def __setitem__(self, url: str, feed_state: FeedState) -> None:
+        self._changed[url] = feed_state
+        self._deleted.discard(url)
+
+    def __delitem__(self, url: str) -> None:
+        if url not in self:
+            raise KeyError(url)
+        self._changed.pop(url, None)
+        if url in self._base:
+            self._deleted.add(url)
+
+    def __iter__(self) -> Iterator[str]:
+        for url in self._base:
+            if url not in self._deleted:
+                yield url
+        for url in self._changed:
+            if url not in self._base:
+                yield url
+
+    def __len__(self) -> int:
+        return sum(1 for _url in self)
+
+    def __repr__(self) -> str:
+        return f"FeedStates({dict(self.items())!r})"
+
+    def edit(self, url: str) -> FeedState:
+        feed_state = self._changed.get(url)
+        if feed_state is None:
+            base = self._base.get(url) if url not in self._deleted else None
+            feed_state = base.copy() if base is not None else FeedState()
+            self[url] = feed_state
+        return feed_state
+
+    @property
+    def changed(self) -> set[str]:
+        return set(self._changed) | self._deleted
+
+    def snapshot(self) -> dict[str, FeedState]:
+        if not self._changed and not self._deleted and isinstance(self._base, dict):
+            return self._base
+        return {url: self[url] for url in self}
 
 
 @dataclass
 class State:
     last_run_utc: datetime | None
-    feeds: dict[str, FeedState]
+    feeds: FeedStates
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.feeds, FeedStates):
+            self.feeds = FeedStates(self.feeds)
 
     def copy(self) -> "State":
+        # The snapshot only copies references; FeedState objects are duplicated lazily
+        # by FeedStates.edit() when a feed actually changes.
         return State(
             last_run_utc=self.last_run_utc,
-            feeds={k: FeedState(seen_uids=list(v.seen_uids)) for k, v in self.feeds.items()},
+            feeds=FeedStates(self.feeds.snapshot(), origin=self.feeds.origin),
         )
 
 
+def canonical_feed_url(feeds: Mapping[str, FeedState], url: str) -> str:
+    # Follows recorded permanent redirects from a feed-list URL to the one to fetch.
+    visited = {url}
+    feed_state = feeds.get(url)
+    while feed_state is not None and feed_state.canonical_url is not None:
+        url = feed_state.canonical_url
+        if url in visited:
+            break  # A redirect loop someone put in the state file by hand.
+        visited.add(url)
+        feed_state = feeds.get(url)
+    return url
+
+
+def canonical_feed_urls(feed_urls: list[str], feeds: Mapping[str, FeedState]) -> list[str]:
+    # The feed list with recorded redirects applied and duplicates dropped, in order.
+    canonical: dict[str, list[str]] = {}
+    for url in feed_urls:
+        canonical.setdefault(canonical_feed_url(feeds, url), []).append(url)
+    for target, listed in canonical.items():
+        if len(set(listed)) > 1:
+            logging.info(
+                "Feed list entries %s are all %s; fetching it once.", ", ".join(listed), target
+            )
+    return list(canonical)
+
+
+def move_to_canonical(feeds: FeedStates, url: str, canonical_url: str) -> None:
+    # Moves a feed's state to the URL it permanently redirected to, leaving a pointer
+    # behind. If that URL already has state (it is in the feed list too, or another
+    # entry got there first) that state wins, so entries are deduped against it.
+    moved = feeds.get(url)
+    if canonical_url not in feeds and moved is not None:
+        feeds[canonical_url] = replace(moved.copy(), canonical_url=None)
+    feeds[url] = FeedState(canonical_url=canonical_url)
+    logging.info("%s moved permanently to %s.", url, canonical_url)
+
+
 def _dt_to_str(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
@@ -33,7 +292,19 @@ def _dt_from_str(s: str) -> datetime:
     return datetime.fromisoformat(s).astimezone(timezone.utc)
 
 
+_SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def is_sqlite_path(path: str) -> bool:
+    return path.lower().endswith(_SQLITE_SUFFIXES)
+
+
 def load_state(path: str) -> State:
+    if is_sqlite_path(path):
+        from rss_to_email import state_sqlite
+
+        return state_sqlite.load_state(path)
+
     try:
         with open(path, "r", encoding="utf-8") as f:
             raw = json.load(f)
@@ -42,23 +313,72 @@ def load_state(path: str) -> State:
 
     last_run = raw.get("last_run_utc")
     feeds_raw = raw.get("feeds", {}) or {}
-    feeds: dict[str, FeedState] = {}
-    for feed_url, fs in feeds_raw.items():
-        seen_uids = list((fs or {}).get("seen_uids", []) or [])
-        feeds[str(feed_url)] = FeedState(seen_uids=seen_uids)
+    feeds = {str(feed_url): feed_state_from_raw(fs or {}) for feed_url, fs in feeds_raw.items()}
+
+    return State(
+        last_run_utc=_dt_from_str(last_run) if last_run else None,
+        feeds=FeedStates(feeds, origin=os.path.abspath(path)),
+    )
+
+
+_FEED_DATETIME_FIELDS = frozenset(
+    {"last_success_utc", "next_poll_utc", "retry_at_utc", "high_water_utc"}
+)
 
-    return State(last_run_utc=_dt_from_str(last_run) if last_run else None, feeds=feeds)
+
+def feed_state_to_raw(fs: FeedState) -> dict[str, Any]:
+    # Unset optional fields (and zero counters) are left out to keep state files small.
+    raw: dict[str, Any]
+    if isinstance(fs.seen_uids, HashedSeenUids):
+        raw = {"seen_hashes": base64.b64encode(fs.seen_uids.to_bytes()).decode("ascii")}
+    else:
+        raw = {"seen_uids": list(fs.seen_uids)}
+    for f in fields(FeedState):
+        value = getattr(fs, f.name)
+        if f.name == "seen_uids" or value is None or value == f.default:
+            continue
+        raw[f.name] = _dt_to_str(value) if f.name in _FEED_DATETIME_FIELDS else value
+    return raw
+
+
+def feed_state_from_raw(raw: Mapping[str, Any]) -> FeedState:
+    kwargs: dict[str, Any] = {}
+    for f in fields(FeedState):
+        value = raw.get(f.name)
+        if f.name == "seen_uids" or value is None or value == "":
+            continue
+        kwargs[f.name] = _dt_from_str(value) if f.name in _FEED_DATETIME_FIELDS else value
+    seen_uids: SeenUids | HashedSeenUids
+    if raw.get("seen_hashes"):
+        seen_uids = HashedSeenUids.from_bytes(base64.b64decode(raw["seen_hashes"]))
+    else:
+        seen_uids = SeenUids(raw.get("seen_uids") or [])
+    return FeedState(seen_uids=seen_uids, **kwargs)
 
 
 def save_state(path: str, state: State) -> None:
+    if is_sqlite_path(path):
+        from rss_to_email import state_sqlite
+
+        state_sqlite.save_state(path, state)
+        return
+
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
     tmp_path = f"{path}.tmp"
 
     raw = {
         "last_run_utc": _dt_to_str(state.last_run_utc) if state.last_run_utc else None,
-        "feeds": {k: {"seen_uids": v.seen_uids} for k, v in state.feeds.items()},
+        "feeds": {k: feed_state_to_raw(v) for k, v in state.feeds.items()},
     }
     with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(raw, f, indent=2, sort_keys=True)
         f.write("\n")
     os.replace(tmp_path, path)
+
+
+def migrate_state(*, source_path: str, dest_path: str) -> State:
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"State file {source_path!r} does not exist.")
+    state = load_state(source_path)
+    save_state(dest_path, state)
+    return state
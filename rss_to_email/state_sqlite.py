@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+from dataclasses import replace
+
+from rss_to_email.state import (
+    FeedState,
+    FeedStates,
+    HashedSeenUids,
+    SeenUids,
+    State,
+    _dt_from_str,
+    _dt_to_str,
+    feed_state_from_raw,
+    feed_state_to_raw,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS feeds (
+    feed_url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS seen_uids (
+    feed_url TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (feed_url, uid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_uids_by_seq ON seen_uids (feed_url, seq);
+CREATE TABLE IF NOT EXISTS seen_hashes (
+    feed_url TEXT PRIMARY KEY,
+    hashes BLOB NOT NULL
+);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(feeds)")}
+    if "extra" not in columns:
+        conn.execute("ALTER TABLE feeds ADD COLUMN extra TEXT")
+    return conn
+
+
+def _feed_row(fs: FeedState) -> tuple[str | None, str | None, str | None]:
+    # etag/last_modified keep their own columns; other scalar fields go to extra as JSON.
+    raw = feed_state_to_raw(fs)
+    raw.pop("seen_uids", None)
+    raw.pop("seen_hashes", None)
+    etag = raw.pop("etag", None)
+    last_modified = raw.pop("last_modified", None)
+    return etag, last_modified, json.dumps(raw, sort_keys=True) if raw else None
+
+
+def _feed_from_row(
+    etag: str | None,
+    last_modified: str | None,
+    extra: str | None,
+    seen_uids: SeenUids | HashedSeenUids,
+) -> FeedState:
+    raw = json.loads(extra) if extra else {}
+    raw.update(etag=etag, last_modified=last_modified)
+    return replace(feed_state_from_raw(raw), seen_uids=seen_uids)
+
+
+def load_state(path: str) -> State:
+    if not os.path.exists(path):
+        return State(last_run_utc=None, feeds={})
+
+    conn = _connect(path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_run_utc'").fetchone()
+        last_run = row[0] if row else None
+
+        uids: dict[str, list[str]] = {}
+        for feed_url, uid in conn.execute(
+            "SELECT feed_url, uid FROM seen_uids ORDER BY feed_url, seq"
+        ):
+            uids.setdefault(feed_url, []).append(uid)
+        seen: dict[str, SeenUids | HashedSeenUids] = {
+            feed_url: SeenUids(feed_uids) for feed_url, feed_uids in uids.items()
+        }
+        for feed_url, hashes in conn.execute("SELECT feed_url, hashes FROM seen_hashes"):
+            seen[feed_url] = HashedSeenUids.from_bytes(hashes)
+        feeds: dict[str, FeedState] = {
+            feed_url: _feed_from_row(
+                etag, last_modified, extra, seen.pop(feed_url, None) or SeenUids()
+            )
+            for feed_url, etag, last_modified, extra in conn.execute(
+                "SELECT feed_url, etag, last_modified, extra FROM feeds"
+            )
+        }
+        for feed_url, feed_seen in seen.items():
+            feeds[feed_url] = FeedState(seen_uids=feed_seen)
+    finally:
+        conn.close()
+
+    return State(
+        last_run_utc=_dt_from_str(last_run) if last_run else None,
+        feeds=FeedStates(feeds, origin=os.path.abspath(path)),
+    )
+
+
+def _save_seen_hashes(
+    conn: sqlite3.Connection, feed_url: str, seen_uids: HashedSeenUids
+) -> int:
+    # One blob per feed; a history that was just converted from UIDs drops its rows.
+    changed = conn.execute("DELETE FROM seen_uids WHERE feed_url = ?", (feed_url,)).rowcount
+    data = seen_uids.to_bytes()
+    row = conn.execute(
+        "SELECT hashes FROM seen_hashes WHERE feed_url = ?", (feed_url,)
+    ).fetchone()
+    if row is None or row[0] != data:
+        conn.execute(
+            "INSERT OR REPLACE INTO seen_hashes (feed_url, hashes) VALUES (?, ?)",
+            (feed_url, data),
+        )
+        changed += 1
+    return changed
+
+
+def _save_seen_uids(
+    conn: sqlite3.Connection, feed_url: str, seen_uids: SeenUids | HashedSeenUids
+) -> int:
+    if isinstance(seen_uids, HashedSeenUids):
+        return _save_seen_hashes(conn, feed_url, seen_uids)
+    conn.execute("DELETE FROM seen_hashes WHERE feed_url = ?", (feed_url,))
+    stored = [
+        (uid, seq)
+        for uid, seq in conn.execute(
+            "SELECT uid, seq FROM seen_uids WHERE feed_url = ? ORDER BY seq", (feed_url,)
+        )
+    ]
+    stored_uids = [uid for uid, _seq in stored]
+    ordered = list(seen_uids)
+    if stored_uids == ordered:
+        return 0
+
+    # seen_uids only ever grows at the end and is trimmed at the front, so the common
+    # case is: drop a stored prefix, keep the rest in order, append new UIDs.
+    kept = [uid for uid in stored_uids if uid in seen_uids]
+    if ordered[: len(kept)] != kept:
+        conn.execute("DELETE FROM seen_uids WHERE feed_url = ?", (feed_url,))
+        conn.executemany(
+            "INSERT INTO seen_uids (feed_url, uid, seq) VALUES (?, ?, ?)",
+            [(feed_url, uid, seq) for seq, uid in enumerate(ordered)],
+        )
+        return len(stored_uids) + len(ordered)
+
+    removed = [(feed_url, uid) for uid in stored_uids if uid not in seen_uids]
+    next_seq = stored[-1][1] + 1 if stored else 0
+    added = [
+        (feed_url, uid, next_seq + i) for i, uid in enumerate(ordered[len(kept) :])
+    ]
+    conn.executemany("DELETE FROM seen_uids WHERE feed_url = ? AND uid = ?", removed)
+    conn.executemany("INSERT INTO seen_uids (feed_url, uid, seq) VALUES (?, ?, ?)", added)
+    return len(removed) + len(added)
+
+
+def save_state(path: str, state: State) -> None:
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_run_utc', ?)",
+                (_dt_to_str(state.last_run_utc) if state.last_run_utc else None,),
+            )
+
+            # A state loaded from this database only needs its changed feeds written;
+            # anything else (e.g. a migration) is diffed against every stored feed.
+            if state.feeds.origin == os.path.abspath(path):
+                candidates = state.feeds.changed
+            else:
+                candidates = {
+                    url for (url,) in conn.execute("SELECT feed_url FROM feeds")
+                } | set(state.feeds)
+
+            stored_feeds: dict[str, tuple[str | None, str | None, str | None]] = {}
+            for feed_url in candidates:
+                row = conn.execute(
+                    "SELECT etag, last_modified, extra FROM feeds WHERE feed_url = ?",
+                    (feed_url,),
+                ).fetchone()
+                if row is not None:
+                    stored_feeds[feed_url] = (row[0], row[1], row[2])
+
+            dropped = [(url,) for url in candidates if url not in state.feeds]
+            conn.executemany("DELETE FROM seen_uids WHERE feed_url = ?", dropped)
+            conn.executemany("DELETE FROM seen_hashes WHERE feed_url = ?", dropped)
+            conn.executemany("DELETE FROM feeds WHERE feed_url = ?", dropped)
+
+            changed_rows = len(dropped)
+            for feed_url in sorted(candidates):
+                fs = state.feeds.get(feed_url)
+                if fs is None:
+                    continue
+                row = _feed_row(fs)
+                if stored_feeds.get(feed_url) != row:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO feeds (feed_url, etag, last_modified, extra)"
+                        " VALUES (?, ?, ?, ?)",
+                        (feed_url, *row),
+                    )
+                    changed_rows += 1
+                changed_rows += _save_seen_uids(conn, feed_url, fs.seen_uids)
+    finally:
+        conn.close()
+    logging.debug("Saved state to %s (%d rows changed).", path, changed_rows)
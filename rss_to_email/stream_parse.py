@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import feedparser
+
+from rss_to_email.util import coerce_uid
+
+_RDF_ABOUT = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about"
+_ENTRY_TAGS = {"item", "entry"}
+_FEED_TAGS = {"channel", "feed"}
+# Feed-level elements we keep, under the keys feedparser would use.
+_FEED_FIELDS = {
+    "title": "title",
+    "ttl": "ttl",
+    "updatePeriod": "sy_updateperiod",
+    "updateFrequency": "sy_updatefrequency",
+}
+
+
+# Namespaces whose elements feedparser maps onto the fields below: RSS 0.9x/1.0/2.0,
+# Atom 0.3/1.0, Dublin Core and the syndication module. Elements from any other
+# namespace (itunes:title, media:title, ...) are extensions and never fill a field.
+_FEED_NAMESPACES = {
+    "",
+    "http://backend.userland.com/rss2",
+    "http://my.netscape.com/rdf/simple/0.9/",
+    "http://purl.org/rss/1.0/",
+    "http://purl.org/atom/ns#",
+    "http://www.w3.org/2005/Atom",
+    "http://purl.org/dc/elements/1.1/",
+    "http://purl.org/dc/terms/",
+    "http://purl.org/rss/1.0/modules/syndication/",
+}
+
+
+def _local(tag: str) -> str | None:
+    namespace, _, name = tag[1:].rpartition("}") if tag.startswith("{") else ("", "", tag)
+    return name if namespace in _FEED_NAMESPACES else None
+
+
+def _parse_date(text: str | None) -> time.struct_time | None:
+    if not text:
+        return None
+    text = text.strip()
+    dt: datetime | None
+    try:
+        dt = parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError):
+        try:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.utctimetuple()
+
+
+def _entry_from_element(elem: ET.Element) -> feedparser.FeedParserDict:
+    # Mirrors the handful of fields feedparser would give fetch_new_items.
+    entry: dict[str, Any] = {}
+    about = elem.get(_RDF_ABOUT)
+    if about:
+        entry["id"] = about.strip()
+    for child in elem:
+        name = _local(child.tag)
+        text = (child.text or "").strip()
+        if name in {"id", "guid"} and text:
+            entry["id"] = text
+        elif name == "title":
+            entry["title"] = text
+        elif name == "link":
+            href = child.get("href")
+            if href is None:
+                if text:
+                    entry.setdefault("link", text)
+            elif child.get("rel", "alternate") == "alternate":
+                entry.setdefault("link", href.strip())
+        elif name in {"pubDate", "published", "issued"}:
+            entry["published_parsed"] = _parse_date(text)
+        elif name in {"updated", "modified", "date"}:
+            entry["updated_parsed"] = _parse_date(text)
+    return feedparser.FeedParserDict(entry)
+
+
+class IncrementalFeedParser:
+    # Push parser for RSS 0.9x/1.0/2.0 and Atom: feed() bytes as they arrive and get back
+    # the entries completed so far. Entries are dropped from the tree once read, so
+    # memory stays proportional to one entry rather than the whole document.
+
+    def __init__(self) -> None:
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._depth_in_entry = 0
+        self._parents: list[ET.Element] = []
+        self.feed_fields: dict[str, str] = {}
+
+    def feed(self, data: bytes) -> list[feedparser.FeedParserDict]:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> list[feedparser.FeedParserDict]:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list[feedparser.FeedParserDict]:
+        entries: list[feedparser.FeedParserDict] = []
+        for event, elem in self._parser.read_events():
+            name = _local(elem.tag)
+            if event == "start":
+                if name in _ENTRY_TAGS:
+                    self._depth_in_entry += 1
+                self._parents.append(elem)
+                continue
+
+            self._parents.pop()
+            if name in _ENTRY_TAGS:
+                self._depth_in_entry -= 1
+                entries.append(_entry_from_element(elem))
+                if self._parents:
+                    del self._parents[-1][:]
+            elif (
+                name in _FEED_FIELDS
+                and _FEED_FIELDS[name] not in self.feed_fields
+                and not self._depth_in_entry
+                and self._parents
+                and _local(self._parents[-1].tag) in _FEED_TAGS
+            ):
+                text = (elem.text or "").strip()
+                if text:
+                    self.feed_fields[_FEED_FIELDS[name]] = text
+        return entries
+
+
+class EntryCollector:
+    # Decides when an incremental parse can stop: at the item cap, or after
+    # stop_after_seen consecutive entries whose UID is already in seen.
+
+    def __init__(self, *, seen: Any, max_items: int | None, stop_after_seen: int) -> None:
+        self._seen = seen
+        self._max_items = max_items
+        self._stop_after_seen = stop_after_seen
+        self._seen_run = 0
+        self.entries: list[feedparser.FeedParserDict] = []
+        self.done = False
+
+    def add(self, entries: list[feedparser.FeedParserDict]) -> bool:
+        for entry in entries:
+            if self.done:
+                break
+            self.entries.append(entry)
+            uid = coerce_uid(entry)
+            self._seen_run = self._seen_run + 1 if uid and uid in self._seen else 0
+            if self._max_items is not None and len(self.entries) >= self._max_items:
+                self.done = True
+            elif self._stop_after_seen > 0 and self._seen_run >= self._stop_after_seen:
+                self.done = True
+        return self.done
+
+    def result(self, feed: dict[str, str]) -> feedparser.FeedParserDict:
+        return feedparser.FeedParserDict(
+            feed=feedparser.FeedParserDict(feed),
+            entries=self.entries,
+        )
+
+
+class StreamingParse:
+    # Feeds response chunks through IncrementalFeedParser until the collector is
+    # satisfied. Documents expat rejects (HTML entities, broken markup) before their
+    # first entry fall back to a full feedparser.parse of the buffered body; the buffer
+    # is dropped once an entry has been parsed, and a later error keeps the entries
+    # read up to it, so a large feed is never held in memory whole.
+
+    def __init__(self, *, seen: Any, max_items: int | None, stop_after_seen: int) -> None:
+        self._parser = IncrementalFeedParser()
+        self._collector = EntryCollector(
+            seen=seen, max_items=max_items, stop_after_seen=stop_after_seen
+        )
+        self._buffer: list[bytes] | None = []
+        self._failed = False
+
+    def push(self, chunk: bytes) -> bool:
+        if self._buffer is not None:
+            self._buffer.append(chunk)
+        if self._failed:
+            return False
+        try:
+            done = self._collector.add(self._parser.feed(chunk))
+        except ET.ParseError:
+            self._failed = True
+            # Without a buffer there is nothing to fall back to; stop reading.
+            return self._buffer is None
+        if self._collector.entries:
+            self._buffer = None
+        return done
+
+    def finish(self) -> feedparser.FeedParserDict:
+        if not self._collector.done and not self._failed:
+            try:
+                self._collector.add(self._parser.close())
+            except ET.ParseError:
+                self._failed = True
+        if self._failed and self._buffer is not None:
+            return feedparser.parse(b"".join(self._buffer))
+        return self._collector.result(self._parser.feed_fields)
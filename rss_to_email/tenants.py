@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from contextlib import ExitStack
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+
+from rss_to_email.app import RunResult, deliver_and_save
+from rss_to_email.checkpoint import run_lock
+from rss_to_email.config import Config, load_config
+from rss_to_email.feeds import fetch_new_items_shared
+from rss_to_email.httpclient import FetchSession
+from rss_to_email.metrics import RunMetrics, write_run_report
+from rss_to_email.parse_cache import ParseCache
+from rss_to_email.smtp_send import SmtpPool
+from rss_to_email.state import State, load_state
+
+
+@dataclass(frozen=True)
+class Tenant:
+    name: str
+    config: Config
+
+
+@dataclass(frozen=True)
+class TenantsRunResult:
+    results: dict[str, RunResult]
+    run_started_at: datetime
+    metrics: RunMetrics
+
+
+def load_tenants(profiles_path: str) -> list[Tenant]:
+    # A JSON list of profiles, each with its own feed list, state and recipients:
+    #   [{"name": "alice", "feed_list": "alice.txt", "state_path": "alice.json",
+    #     "mail_to": "alice@example.com", "mail_subject_prefix": "News"}, ...]
+    # Relative paths are resolved against the profiles file. Everything else (SMTP
+    # server, fetch settings) comes from the environment as usual.
+    with open(profiles_path, "r", encoding="utf-8") as f:
+        profiles = json.load(f)
+    if not isinstance(profiles, list) or not profiles:
+        raise ValueError(f"No profiles found in {profiles_path!r}.")
+
+    base_dir = os.path.dirname(os.path.abspath(profiles_path))
+    tenants: list[Tenant] = []
+    for i, profile in enumerate(profiles):
+        missing = [key for key in ("feed_list", "state_path", "mail_to") if not profile.get(key)]
+        if missing:
+            raise ValueError(f"Profile {i} in {profiles_path!r} is missing {', '.join(missing)}.")
+        config = load_config(
+            feed_list_path=os.path.join(base_dir, profile["feed_list"]),
+            state_path=os.path.join(base_dir, profile["state_path"]),
+            mail_to=profile["mail_to"],
+        )
+        if config.spool_path:
+            raise ValueError("SPOOL_PATH and SHARD_COUNT are not supported with profiles.")
+        if profile.get("mail_subject_prefix"):
+            config = replace(config, mail_subject_prefix=profile["mail_subject_prefix"])
+        tenants.append(Tenant(name=str(profile.get("name") or i), config=config))
+
+    names = [tenant.name for tenant in tenants]
+    state_paths = [os.path.abspath(tenant.config.state_path) for tenant in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Profile names in {profiles_path!r} must be unique.")
+    if len(set(state_paths)) != len(state_paths):
+        raise ValueError(f"Each profile in {profiles_path!r} needs its own state_path.")
+    return tenants
+
+
+def run_tenants(
+    *,
+    profiles_path: str,
+    session: FetchSession | None = None,
+    smtp: SmtpPool | None = None,
+    parse_cache: ParseCache | None = None,
+) -> TenantsRunResult:
+    tenants = load_tenants(profiles_path)
+    config = tenants[0].config
+    metrics = RunMetrics()
+    # Shared fetches aren't journaled (CHECKPOINT_SECONDS), but every profile's state is
+    # locked so that a run never overlaps with another one, or with run_once on it.
+    try:
+        with ExitStack() as locks:
+            for tenant in tenants:
+                locks.enter_context(run_lock(tenant.config.state_path))
+            with metrics.stage("state_load"):
+                prior_states = [load_state(tenant.config.state_path) for tenant in tenants]
+            return run_tenants_with_state(
+                tenants=tenants,
+                prior_states=prior_states,
+                session=session,
+                smtp=smtp,
+                metrics=metrics,
+                parse_cache=parse_cache,
+            )
+    finally:
+        if config.run_report_path:
+            write_run_report(config.run_report_path, metrics)
+
+
+def run_tenants_with_state(
+    *,
+    tenants: list[Tenant],
+    prior_states: list[State],
+    session: FetchSession | None = None,
+    smtp: SmtpPool | None = None,
+    metrics: RunMetrics | None = None,
+    parse_cache: ParseCache | None = None,
+) -> TenantsRunResult:
+    # run_with_state for many tenants: one fetch pass over the union of their feed
+    # lists, then a digest and state save per tenant. A tenant whose mail or save fails
+    # doesn't stop the others; the failures are raised together at the end.
+    if metrics is None:
+        metrics = RunMetrics()
+    config = tenants[0].config
+    run_started_at = datetime.now(timezone.utc)
+
+    with metrics.stage("fetch"):
+        outcomes = fetch_new_items_shared(
+            subscriptions=[
+                (tenant.config, prior_state) for tenant, prior_state in zip(tenants, prior_states)
+            ],
+            run_started_at=run_started_at,
+            config=config,
+            session=session,
+            metrics=metrics,
+            parse_cache=parse_cache,
+        )
+    metrics.new_items = sum(len(new_items) for new_items, _failures, _state in outcomes)
+    metrics.failures = len({f for _new_items, failures, _state in outcomes for f in failures})
+
+    own_smtp = smtp is None
+    if smtp is None:
+        smtp = SmtpPool(config.smtp)
+    results: dict[str, RunResult] = {}
+    failed: list[str] = []
+    try:
+        for tenant, prior_state, (new_items, failures, next_state) in zip(
+            tenants, prior_states, outcomes
+        ):
+            try:
+                results[tenant.name] = deliver_and_save(
+                    config=tenant.config,
+                    prior_state=prior_state,
+                    new_items=new_items,
+                    failures=failures,
+                    next_state=next_state,
+                    run_started_at=run_started_at,
+                    smtp=smtp,
+                    metrics=metrics,
+                )
+            except Exception:
+                logging.exception("Run failed for profile %s.", tenant.name)
+                failed.append(tenant.name)
+    finally:
+        if own_smtp:
+            smtp.close()
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(tenants)} profiles failed: {', '.join(failed)}")
+    return TenantsRunResult(results, run_started_at, metrics)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import calendar
+import os
 from datetime import datetime, timezone
 from typing import Any
 
@@ -25,6 +26,16 @@ def read_feed_list(path: str) -> list[str]:
     return urls
 
 
+def write_atomic(path: str, data: bytes) -> None:
+    # Readers see the old file or the complete new one, even after a crash.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
 def safe_get(obj: Any, *keys: str) -> Any:
     cur: Any = obj
     for key in keys:
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from benchmarks.feed_server import FakeFeedServer, FeedServerConfig
+from benchmarks.smtp_sink import SmtpSink
+
+
+@pytest.fixture
+def feed_server() -> Iterator[FakeFeedServer]:
+    server = FakeFeedServer(
+        FeedServerConfig(feeds=24, items_per_feed=5, item_bytes=100, hosts=3)
+    ).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def smtp_sink() -> Iterator[SmtpSink]:
+    sink = SmtpSink().start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def feed_list(
+    tmp_path: Path, feed_server: FakeFeedServer, smtp_sink: SmtpSink, monkeypatch: pytest.MonkeyPatch
+) -> str:
+    # A feed list for every feed on feed_server, with mail going to smtp_sink.
+    path = tmp_path / "feeds.txt"
+    path.write_text("\n".join(feed_server.feed_urls()) + "\n")
+    for name, value in {
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_sink.port),
+        "SMTP_USERNAME": "user",
+        "SMTP_PASSWORD": "password",
+        "SMTP_FROM": "from@example.invalid",
+        "SMTP_TO": "to@example.invalid",
+        "SMTP_USE_TLS": "false",
+    }.items():
+        monkeypatch.setenv(name, value)
+    return str(path)
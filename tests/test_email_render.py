@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from rss_to_email.email_render import render_digests
+from rss_to_email.feeds import FeedItem
+
+_NOW = datetime(2025, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+def _item(domain: str, n: int, age_minutes: int) -> FeedItem:
+    return FeedItem(
+        feed_url=f"https://{domain}/feed.xml",
+        feed_domain=domain,
+        feed_title=domain,
+        entry_uid=f"{domain}-{n}",
+        entry_title=f"{domain} item {n}",
+        entry_link=f"https://{domain}/{n}",
+        published_utc=_NOW - timedelta(minutes=age_minutes),
+    )
+
+
+def test_max_items_below_domain_count_drops_whole_domains() -> None:
+    # Five domains, two items each; the newest three are from a.test and b.test.
+    items = [
+        _item(domain, n, age_minutes=10 * rank + n)
+        for rank, domain in enumerate(["a.test", "b.test", "c.test", "d.test", "e.test"])
+        for n in range(2)
+    ]
+    [(subject, text, html)] = render_digests(
+        items=items, failures=[], now_utc=_NOW, subject_prefix="Digest", max_items=3
+    )
+
+    assert subject == "Digest (10 new)"
+    assert html.count("<h2>") == 2
+    assert "<h2>a.test</h2>" in html and "<h2>b.test</h2>" in html
+    assert "<ol>\n</ol>" not in html
+    for domain in ("c.test", "d.test", "e.test"):
+        assert domain not in html and domain not in text
+    assert "… and 1 more from b.test" in text
+    assert "… and 6 more from 3 other sources" in text
+    assert "… and 6 more from 3 other sources" in html
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from benchmarks.feed_server import FakeFeedServer
+from rss_to_email.config import Config, load_config
+from rss_to_email.feeds import FeedItem, fetch_new_items
+from rss_to_email.state import State, save_state
+
+
+def _fetch(config: Config, state: State, now: datetime) -> tuple[list[FeedItem], State]:
+    items, failures, next_state = fetch_new_items(
+        feed_urls=config.feed_urls, prior_state=state, run_started_at=now, config=config
+    )
+    assert failures == []
+    next_state.last_run_utc = now
+    return items, next_state
+
+
+def _saved(state: State, path: Path) -> dict:
+    save_state(str(path), state)
+    return json.loads(path.read_text())
+
+
+@pytest.mark.parametrize("parse_mode", ["full", "incremental"])
+def test_threads_and_asyncio_agree(
+    feed_server: FakeFeedServer, feed_list: str, tmp_path: Path, parse_mode: str
+) -> None:
+    config = load_config(feed_list_path=feed_list, state_path=str(tmp_path / "state.json"))
+    engines = {
+        engine: replace(config, fetch_engine=engine, parse_mode=parse_mode)
+        for engine in ("threads", "asyncio")
+    }
+    states = {engine: State(last_run_utc=None, feeds={}) for engine in engines}
+
+    # A warm start, a run where nothing changed (all 304s) and one after some feeds
+    # published; each engine starts every step from its own state.
+    for step in range(3):
+        if step == 2:
+            assert feed_server.publish(0.5) > 0
+        now = datetime.now(timezone.utc)
+        items = {}
+        for engine, engine_config in engines.items():
+            items[engine], states[engine] = _fetch(engine_config, states[engine], now)
+        assert items["threads"] == items["asyncio"]
+        assert _saved(states["threads"], tmp_path / "threads.json") == _saved(
+            states["asyncio"], tmp_path / "asyncio.json"
+        )
+    assert items["threads"]
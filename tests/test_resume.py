@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import rss_to_email.feeds as feeds
+from benchmarks.feed_server import FakeFeedServer
+from benchmarks.smtp_sink import SmtpSink
+from rss_to_email.app import RunResult, run_once
+from rss_to_email.checkpoint import Journal
+from rss_to_email.feeds import FeedItem
+
+
+def _keys(items: list[FeedItem]) -> list[tuple[str, str]]:
+    return sorted((item.feed_url, item.entry_uid) for item in items)
+
+
+@pytest.fixture(params=["threads", "asyncio"])
+def engine(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setenv("FETCH_ENGINE", request.param)
+    return request.param
+
+
+def test_killed_run_resumes_from_journal(
+    engine: str,
+    feed_server: FakeFeedServer,
+    smtp_sink: SmtpSink,
+    feed_list: str,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    state_path = str(tmp_path / "state.json")
+
+    def run() -> RunResult:
+        return run_once(feed_list_path=feed_list, state_path=state_path)
+
+    run()
+    feed_server.publish(0.5)
+
+    # What an uninterrupted run would find, from a copy of the state.
+    shutil.copy(state_path, tmp_path / "before.json")
+    expected = _keys(run().new_items)
+    assert expected
+    shutil.copy(tmp_path / "before.json", state_path)
+
+    # Kill the run once ten feeds are in, as if the process died there.
+    dedupe_feed = feeds._dedupe_feed
+    calls = 0
+
+    def killed_after_ten(**kwargs: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        if calls > 10:
+            raise SystemExit("killed")
+        return dedupe_feed(**kwargs)
+
+    monkeypatch.setattr(feeds, "_dedupe_feed", killed_after_ten)
+    with pytest.raises(SystemExit):
+        run()
+    monkeypatch.setattr(feeds, "_dedupe_feed", dedupe_feed)
+    assert os.path.exists(state_path + ".journal")
+
+    messages_before = smtp_sink.messages
+    result = run()
+    assert _keys(result.new_items) == expected
+    # The ten journaled feeds weren't fetched again, and one digest went out.
+    assert len(result.metrics.feeds) == len(feed_server.feed_urls()) - 10
+    assert smtp_sink.messages - messages_before == 1
+    assert not os.path.exists(state_path + ".journal")
+
+
+def test_run_killed_after_delivery_mails_nothing_twice(
+    engine: str,
+    feed_server: FakeFeedServer,
+    smtp_sink: SmtpSink,
+    feed_list: str,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    state_path = str(tmp_path / "state.json")
+
+    def run() -> RunResult:
+        return run_once(feed_list_path=feed_list, state_path=state_path)
+
+    run()
+    feed_server.publish(0.5)
+
+    # Kill the run between sending the digest and saving state.
+    mark_delivered = Journal.mark_delivered
+
+    def killed_after_delivery(self: Journal) -> None:
+        mark_delivered(self)
+        raise SystemExit("killed")
+
+    monkeypatch.setattr(Journal, "mark_delivered", killed_after_delivery)
+    with pytest.raises(SystemExit):
+        run()
+    monkeypatch.setattr(Journal, "mark_delivered", mark_delivered)
+    assert smtp_sink.messages == 1
+
+    result = run()
+    assert result.new_items == []
+    assert result.metrics.feeds == {}
+    assert not os.path.exists(state_path + ".journal")
+    assert run().new_items == []
+    assert smtp_sink.messages == 1
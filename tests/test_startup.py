@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from rss_to_email.state import FeedState, State, save_state
+
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+_HEAVY_MODULES = ("requests", "feedparser", "aiohttp", "croniter", "smtplib", "email.message")
+
+
+def _imported(importtime: str) -> set[str]:
+    # Lines look like "import time: <self us> | <cumulative us> | <indented module>".
+    modules = set()
+    for line in importtime.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.add(parts[2].strip())
+    return modules
+
+
+def test_nothing_due_run_skips_heavy_imports(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    feed_urls = [f"http://127.0.0.1:9/feed/{i}.xml" for i in range(5)]
+    feed_list = tmp_path / "feeds.txt"
+    feed_list.write_text("\n".join(feed_urls) + "\n")
+    now = datetime.now(timezone.utc)
+    state_path = tmp_path / "state.json"
+    save_state(
+        str(state_path),
+        State(
+            last_run_utc=now,
+            feeds={url: FeedState(next_poll_utc=now + timedelta(hours=1)) for url in feed_urls},
+        ),
+    )
+    for name, value in {
+        "FEED_LIST_PATH": str(feed_list),
+        "STATE_PATH": str(state_path),
+        "ADAPTIVE_POLLING": "true",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_USERNAME": "user",
+        "SMTP_PASSWORD": "password",
+        "SMTP_FROM": "from@example.invalid",
+        "SMTP_TO": "to@example.invalid",
+        "PYTHONPATH": _REPO_ROOT,
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "rss_to_email"],
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+    imported = _imported(proc.stderr)
+    assert "rss_to_email.app" in imported
+    assert [name for name in _HEAVY_MODULES if name in imported] == []
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import feedparser
+import pytest
+
+from rss_to_email.stream_parse import IncrementalFeedParser
+
+_PODCAST = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"
+     xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"
+     xmlns:media="http://search.yahoo.com/mrss/"
+     xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <channel>
+    <itunes:title>Show title</itunes:title>
+    <title>Channel title</title>
+    <item>
+      <title>Real title</title>
+      <itunes:title>iTunes title</itunes:title>
+      <media:title>Media title</media:title>
+      <link>https://example.com/episodes/1</link>
+      <media:link>https://cdn.example.com/1.mp3</media:link>
+      <guid isPermaLink="false">episode-1</guid>
+      <itunes:guid>itunes-episode-1</itunes:guid>
+      <pubDate>Mon, 06 Jan 2025 10:00:00 GMT</pubDate>
+      <dc:date>2025-01-07T10:00:00Z</dc:date>
+      <media:date>2020-01-01T00:00:00Z</media:date>
+    </item>
+  </channel>
+</rss>
+"""
+
+_FIELDS = ("id", "title", "link", "published_parsed", "updated_parsed")
+
+
+@pytest.mark.parametrize("chunk_size", [len(_PODCAST), 7])
+def test_namespaced_children_match_feedparser(chunk_size: int) -> None:
+    expected = feedparser.parse(_PODCAST)
+    parser = IncrementalFeedParser()
+    entries = []
+    for start in range(0, len(_PODCAST), chunk_size):
+        entries += parser.feed(_PODCAST[start : start + chunk_size])
+    entries += parser.close()
+
+    assert len(entries) == len(expected.entries) == 1
+    assert {f: entries[0].get(f) for f in _FIELDS} == {
+        f: expected.entries[0].get(f) for f in _FIELDS
+    }
+    assert parser.feed_fields["title"] == expected.feed.title == "Channel title"